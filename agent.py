@@ -1,34 +1,398 @@
-import requests
+import glob
+import hashlib
 import json
+import os
+import re
+import sqlite3
 import sys
-from logjuicer import LogJuicer
+import threading
+import time
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                TimeoutError, wait)
+from clustering import FailureClusters
+from metrics import (METRICS, count, in_worker, observe, profile_to, span,
+                     trace_to)
+from results import AnalysisStore, diff_key
+from signatures import correlate, format_candidates
+
+# Bound on in-flight Lightspeed queries, the model is the scarce resource
+OLS_WORKERS = 4
+# Diffs are cut off beyond this size instead of overflowing the model context
+MAX_DIFF_BYTES = 256 * 1024
+# Per query token budget, larger diffs are map-reduced over chunks
+TOKEN_BUDGET = 8000
+# Rough token estimate for llama style tokenizers
+CHARS_PER_TOKEN = 4
+# Seconds to connect and to wait for a response, local models can be slow
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 300
+# Retries with exponential backoff on connection errors and 5xx responses
+RETRIES = 3
+BACKOFF_FACTOR = 1
+# Responses are reused for a day, least recently used beyond the limit go
+RESPONSE_CACHE = os.environ.get(
+    "OLS_CACHE_DB",
+    os.path.join(os.path.expanduser("~"), ".cache", "lightspeed-agent",
+                 "responses.db"))
+RESPONSE_CACHE_TTL = 24 * 3600
+RESPONSE_CACHE_MAX_ENTRIES = 10000
+# Seconds the readiness probe may take, a successful probe is trusted by
+# every run for HEALTH_TTL seconds
+HEALTH_TIMEOUT = 2
+HEALTH_TTL = 60
+HEALTH_CACHE = os.path.join(os.path.dirname(RESPONSE_CACHE), "health.json")
+MODEL = "llama3.1:latest"
+PROVIDER = "ollama"
+
+ANALYZE_PROMPT = """This is a log diff of a failure in an OS latency,\
+            network latency or other performance related test,\
+            analyze this log, write a triage summary describing failure and \
+            give the exact path to relevant must-gather log files\n\
+                """
+
+MAP_PROMPT = """This is part {part} of {parts} of a log diff of a failure in \
+an OS latency, network latency or other performance related test. \
+Summarize the anomalies in this part that could explain the failure, keep \
+exact error messages, test names, thresholds and log file paths.
+
+Log diff part:
+"""
+
+REDUCE_PROMPT = """These are partial triage summaries of consecutive parts \
+of one log diff. Combine them into a single summary, keep exact error \
+messages, test names, thresholds and log file paths.
+
+Partial summaries:
+"""
+
+SUMMARY_CUT = "\n[summary truncated]"
+
+SUMMARIES_HEADER = """
+The log diff is too large for a single query, these are triage summaries of \
+its consecutive parts:
+"""
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def chunk_text(text, token_budget):
+    """Split text into chunks of at most token_budget tokens.
+
+    Chunks are cut on anomaly block boundaries, blocks larger than the
+    budget are cut on line boundaries and single huge lines are cut hard.
+    """
+    from logjuicer import anomaly_blocks
+
+    max_chars = token_budget * CHARS_PER_TOKEN
+    pieces = []
+    for block in anomaly_blocks(text.splitlines(keepends=True)):
+        if len(block) <= max_chars:
+            pieces.append(block)
+            continue
+        for line in block.splitlines(keepends=True):
+            pieces.extend(line[i:i + max_chars]
+                          for i in range(0, len(line), max_chars))
+
+    chunks = []
+    chunk = []
+    size = 0
+    for piece in pieces:
+        if chunk and size + len(piece) > max_chars:
+            chunks.append("".join(chunk))
+            chunk = []
+            size = 0
+        chunk.append(piece)
+        size += len(piece)
+    if chunk:
+        chunks.append("".join(chunk))
+    return chunks
+
+
+def cut_summaries(summaries, max_chars):
+    """Cut every summary to an equal share of max_chars characters once
+    joined"""
+    share = max(0, max_chars // len(summaries) - len("\n\n")
+                - len(SUMMARY_CUT))
+    return [summary if len(summary) <= share
+            else summary[:share] + SUMMARY_CUT for summary in summaries]
+
+
+def normalize_query(query):
+    return " ".join(query.split()).lower()
+
+
+def query_fingerprint(query):
+    """Key of near-duplicate queries, numbers, hex ids and timestamps in
+    the query do not change it"""
+    text = normalize_query(query)
+    text = re.sub(r"\b[0-9a-f]{8,}\b", "<hex>", text)
+    text = re.sub(r"\d+([.:\-/t]\d+)*", "<num>", text)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Persistent SQLite cache of Lightspeed responses.
+
+    Responses are keyed by the normalized query text, model and provider,
+    expire after ttl seconds and the least recently used ones are evicted
+    beyond max_entries. With fuzzy set, queries that only differ in
+    numbers, ids or timestamps share their responses.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE, ttl=RESPONSE_CACHE_TTL,
+                 max_entries=RESPONSE_CACHE_MAX_ENTRIES, fuzzy=False):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.fuzzy = fuzzy
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self.connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, fingerprint TEXT, model TEXT,
+                provider TEXT, response TEXT, created REAL, accessed REAL)""")
+            db.execute("""CREATE INDEX IF NOT EXISTS responses_fingerprint
+                ON responses (fingerprint)""")
+            db.execute("""CREATE INDEX IF NOT EXISTS responses_accessed
+                ON responses (accessed)""")
+            db.execute("""CREATE TABLE IF NOT EXISTS stats (
+                name TEXT PRIMARY KEY, value INTEGER)""")
+
+    def connect(self):
+        # One connection per operation, queries run from several threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def key(self, query, model, provider):
+        return hashlib.sha256(
+            f"{model}\0{provider}\0{normalize_query(query)}".encode()
+        ).hexdigest()
+
+    def count(self, db, name):
+        db.execute("""INSERT INTO stats VALUES (?, 1) ON CONFLICT(name)
+            DO UPDATE SET value = value + 1""", (name,))
+
+    def get(self, query, model, provider):
+        now = time.time()
+        with self.connect() as db:
+            row = db.execute(
+                "SELECT key, response FROM responses WHERE key = ? "
+                "AND created > ?",
+                (self.key(query, model, provider), now - self.ttl)
+            ).fetchone()
+            if row is None and self.fuzzy:
+                row = db.execute(
+                    "SELECT key, response FROM responses WHERE "
+                    "fingerprint = ? AND model = ? AND provider = ? AND "
+                    "created > ? ORDER BY created DESC LIMIT 1",
+                    (query_fingerprint(query), model, provider,
+                     now - self.ttl)).fetchone()
+                if row is not None:
+                    self.count(db, "fuzzy_hits")
+            if row is None:
+                self.count(db, "misses")
+                return None
+            self.count(db, "hits")
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?",
+                       (now, row[0]))
+            return json.loads(row[1])
+
+    def put(self, query, model, provider, response):
+        now = time.time()
+        with self.connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.key(query, model, provider), query_fingerprint(query),
+                 model, provider, json.dumps(response), now, now))
+            db.execute("DELETE FROM responses WHERE created <= ?",
+                       (now - self.ttl,))
+            db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM "
+                "responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+
+    def stats(self):
+        with self.connect() as db:
+            stats = dict(db.execute("SELECT name, value FROM stats"))
+            stats["entries"] = db.execute(
+                "SELECT COUNT(*) FROM responses").fetchone()[0]
+        for name in ("hits", "fuzzy_hits", "misses"):
+            stats.setdefault(name, 0)
+        return stats
+
+
+def recently_ready(url, ttl=HEALTH_TTL):
+    """Whether a readiness probe of url succeeded in the last ttl seconds"""
+    try:
+        with open(HEALTH_CACHE) as f:
+            return time.time() - json.load(f).get(url, 0) < ttl
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+def mark_ready(url):
+    try:
+        with open(HEALTH_CACHE) as f:
+            ready = json.load(f)
+    except (OSError, ValueError):
+        ready = {}
+    ready[url] = time.time()
+    try:
+        os.makedirs(os.path.dirname(HEALTH_CACHE) or '.', exist_ok=True)
+        with open(f"{HEALTH_CACHE}.{os.getpid()}", "w") as f:
+            json.dump(ready, f)
+        os.replace(f"{HEALTH_CACHE}.{os.getpid()}", HEALTH_CACHE)
+    except OSError as e:
+        print(f"Could not cache the Lightspeed Service status: {e}")
 
 
 class OLSClient:
-    """Python client for OpenShift Lightspeed service"""
+    """Python client for OpenShift Lightspeed service
 
-    def __init__(self, url, auth_token=None):
+    All requests share one pooled keep-alive session, connection errors
+    and 5xx responses are retried with exponential backoff. The session is
+    created on first use, runs answered from the caches never import
+    requests. Readiness is probed in the background and only waited for
+    before the first query that reaches the service. At most max_queries
+    queries of all callers are in flight at once.
+    """
+
+    def __init__(self, url, auth_token=None,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=RETRIES,
+                 pool_size=OLS_WORKERS * 4, cache=None,
+                 max_queries=OLS_WORKERS):
+        self.cache = cache
+        self.slots = threading.BoundedSemaphore(max_queries)
+        self.url = url
         self.endpoint = f"{url}/v1/query"
+        self.streaming_endpoint = f"{url}/v1/streaming_query"
         self.auth_token = auth_token
-        self.connect()
+        self.timeout = timeout
+        self.retries = retries
+        self.pool_size = pool_size
+        self.lock = threading.Lock()
+        self._session = None
+        self.health = None
+        self.health_lock = threading.Lock()
+        self.ready = None
 
-    def connect(self):
-        print("Waiting for Lightspeed Service status")
-        if requests.get(self.endpoint).status_code == 200:
-            print("Service Authenticated")
-            return True
-        return False
+    @property
+    def session(self):
+        with self.lock:
+            if self._session is None:
+                self._session = self.create_session()
+            return self._session
+
+    def create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        session = requests.Session()
+        # Read timeouts are not retried, the model is already busy with it
+        retry = Retry(total=self.retries, connect=self.retries, read=0,
+                      status=self.retries, backoff_factor=BACKOFF_FACTOR,
+                      status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=None, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                              max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["Content-Type"] = "application/json"
+        if self.auth_token:
+            session.headers["Authorization"] = f"Bearer {self.auth_token}"
+        return session
+
+    def check_health(self):
+        """Start probing /readiness in a background thread, returns the
+        future of the probe error, None when the service is ready.
+
+        The probe runs once per client and is skipped within HEALTH_TTL
+        seconds of a successful probe of any run.
+        """
+        with self.lock:
+            if self.health is None:
+                self.health = Future()
+                threading.Thread(target=self.probe, daemon=True).start()
+            return self.health
+
+    def probe(self):
+        error = None
+        with span("health_check") as attrs:
+            attrs["cached"] = recently_ready(self.url)
+            if not attrs["cached"]:
+                # Not the session, its retries would outlast the timeout
+                import requests
+
+                headers = {"Authorization": f"Bearer {self.auth_token}"} \
+                    if self.auth_token else {}
+                try:
+                    status = requests.get(f"{self.url}/readiness",
+                                          headers=headers,
+                                          timeout=HEALTH_TIMEOUT).status_code
+                    if status != 200:
+                        error = f"readiness status {status}"
+                except requests.exceptions.RequestException as e:
+                    error = str(e)
+                if error is None:
+                    mark_ready(self.url)
+        self.health.set_result(error)
+
+    def wait_ready(self, timeout=HEALTH_TIMEOUT):
+        """Wait at most timeout seconds for the readiness probe and print
+        its outcome once, returns whether the service is ready"""
+        health = self.check_health()
+        with self.health_lock:
+            if self.ready is None:
+                try:
+                    error = health.result(timeout)
+                except TimeoutError:
+                    error = f"no readiness answer within {timeout}s"
+                self.ready = error is None
+                if self.ready:
+                    print("Connected to Lightspeed Service")
+                else:
+                    print(f"Lightspeed Service unreachable: {error}")
+            return self.ready
+
+    def query(self, query, model=MODEL, provider=PROVIDER, stream=False):
+        observe("prompt_bytes", len(query))
+        with span("ols_query", bytes=len(query), stream=stream) as attrs:
+            if self.cache:
+                response = self.cache.get(query, model, provider)
+                count("response_cache",
+                      result="miss" if response is None else "hit")
+                if response is not None:
+                    attrs["cached"] = True
+                    print("Using cached Lightspeed response")
+                    if stream:
+                        print('------------------------------------------->\n'
+                              + response.get("response", ""))
+                    return response
+            self.wait_ready()
+            with self.slots:
+                if stream:
+                    response = render_stream(self.query_stream(
+                        query, model, provider))
+                else:
+                    response = self.post(query)
+            if self.cache:
+                self.cache.put(query, model, provider, response)
+            for tool_result in response.get("tool_results", []):
+                count("tool_calls", name=tool_result.get("name", "Tool"),
+                      status=tool_result.get("status", "unknown"))
+            attrs["response_bytes"] = len(response.get("response", ""))
+            return response
+
+    def post(self, query):
+        import requests
 
-    def query(self, query, model="llama3.1:latest", provider="ollama"):
         payload = {
             "query": query
         }
-        headers = {"Content-Type": "application/json"}
-        if self.auth_token:
-            headers["Authorization"] = f"Bearer {self.auth_token}"
         try:
-            response = requests.post(self.endpoint, json=payload,
-                                     headers=headers)
+            response = self.session.post(self.endpoint, json=payload,
+                                         timeout=self.timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -38,6 +402,129 @@ class OLSClient:
                 error_msg += f", Error: {error_data.get('error', 'Unknown')}"
             raise Exception(error_msg)
 
+    def query_stream(self, query, model=MODEL, provider=PROVIDER):
+        """Yield (event, data) pairs of a streaming query as they arrive.
+
+        Events are "start", "token", "tool_call", "tool_result" and "end".
+        """
+        import requests
+
+        payload = {
+            "query": query,
+            "media_type": "application/json"
+        }
+        try:
+            response = self.session.post(self.streaming_endpoint,
+                                         json=payload, timeout=self.timeout,
+                                         stream=True)
+            response.raise_for_status()
+            with response:
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("data:"):
+                        line = line[len("data:"):].strip()
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event.get("event") == "error":
+                        error = event.get("data", {})
+                        raise Exception(
+                            f"Failed to query Lightspeed service: "
+                            f"{error.get('response', 'Unknown')}, "
+                            f"Error: {error.get('cause', 'Unknown')}")
+                    yield event.get("event"), event.get("data", {})
+        except requests.exceptions.RequestException as e:
+            raise Exception(
+                f"Failed to query Lightspeed service: {str(e)}")
+
+    def query_chunked(self, prompt, diff, token_budget=TOKEN_BUDGET,
+                      concurrency=OLS_WORKERS, stream=False, **kwargs):
+        """Query with a diff that may not fit in a single request.
+
+        Diffs over token_budget are split into chunks that are summarized
+        concurrently (map), the summaries are then combined with prompt in a
+        final query (reduce). Tool results of all queries are kept, only the
+        final query is streamed.
+        """
+        if estimate_tokens(prompt + diff) <= token_budget:
+            return self.query(prompt + diff, stream=stream, **kwargs)
+
+        # Leave room for the instructions wrapped around every chunk
+        budget = token_budget - estimate_tokens(
+            max(MAP_PROMPT, REDUCE_PROMPT, prompt, key=len))
+        if budget <= 0:
+            raise Exception(f"Token budget {token_budget} is too small "
+                            f"for the prompt")
+        chunks = chunk_text(diff, budget)
+        print(f"Diff exceeds {token_budget} tokens, summarizing "
+              f"{len(chunks)} chunks")
+        with span("ols_map_reduce", chunks=len(chunks)) as attrs, \
+                ThreadPoolExecutor(max_workers=concurrency) as pool:
+            responses = list(pool.map(
+                lambda part: self.query(MAP_PROMPT.format(
+                    part=part[0], parts=len(chunks)) + part[1], **kwargs),
+                enumerate(chunks, 1)))
+            summaries = [response.get("response", "")
+                         for response in responses]
+
+            # Combine summaries in rounds until they fit the final query
+            while estimate_tokens(prompt + SUMMARIES_HEADER
+                                  + "\n\n".join(summaries)) > token_budget:
+                batches = chunk_text("\n\n".join(summaries), budget)
+                if len(summaries) == 1 or len(batches) >= len(summaries):
+                    # Too long to be combined any further
+                    print(f"Cutting {len(summaries)} summaries down to the "
+                          f"token budget")
+                    summaries = cut_summaries(
+                        summaries, (token_budget - 1) * CHARS_PER_TOKEN
+                        - len(prompt + SUMMARIES_HEADER))
+                    attrs["cut"] = True
+                    break
+                print(f"Combining {len(summaries)} summaries into "
+                      f"{len(batches)}")
+                reduced = list(pool.map(
+                    lambda batch: self.query(REDUCE_PROMPT + batch, **kwargs),
+                    batches))
+                attrs["rounds"] = attrs.get("rounds", 0) + 1
+                responses += reduced
+                summaries = [response.get("response", "")
+                             for response in reduced]
+
+        response = self.query(prompt + SUMMARIES_HEADER
+                              + "\n\n".join(summaries), stream=stream,
+                              **kwargs)
+        tool_results = [tool_result for partial in responses
+                        for tool_result in partial.get("tool_results", [])]
+        response["tool_results"] = \
+            tool_results + response.get("tool_results", [])
+        return response
+
+
+class AsyncOLSClient:
+    """asyncio front end of OLSClient.
+
+    Queries run on the pooled session in worker threads, at most
+    concurrency of them at a time.
+    """
+
+    def __init__(self, client, concurrency=OLS_WORKERS):
+        import asyncio
+
+        self.client = client
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def query(self, query, **kwargs):
+        import asyncio
+
+        async with self.semaphore:
+            return await asyncio.to_thread(self.client.query, query,
+                                           **kwargs)
+
+    async def query_many(self, queries, **kwargs):
+        import asyncio
+
+        return await asyncio.gather(
+            *(self.query(query, **kwargs) for query in queries))
+
 
 def check_jira_config():
 
@@ -47,50 +534,502 @@ def check_jira_config():
     return True
 
 
+def jira_prompt(project_key, logdiff):
+    """Analysis prompt asking for related Jira issues in project_key"""
+    # Search Jira for the failure signatures up front, saving the
+    # model a tool call round trip
+    jira_step = f"""3. Use the search_jira_issues tool to find related Jira issues 
+               in project '{project_key}' that might be related to this failure"""
+    try:
+        candidates = correlate(logdiff, [project_key])
+    except Exception as e:
+        print(f"Jira correlation skipped: {e}")
+        candidates = []
+    if candidates:
+        print(f"Found {len(candidates)} candidate Jira issues:\n"
+              + format_candidates(candidates))
+        jira_step = f"""3. These Jira issues in project '{project_key}' match the failure 
+               signatures of this log, say which ones are related to this 
+               failure and only use the search_jira_issues tool if none is:
+{format_candidates(candidates)}"""
+
+    return f"""This is a log diff of a failure in an OS latency,\
+            network latency or other performance related test.\
+            
+            Please:
+            1. Analyze this log and write a triage summary describing the 
+               failure
+            2. Give the exact path to relevant must-gather log files based 
+               on the log content (do not use oc_logs tool)
+            {jira_step}
+            4. Present the Jira search results separately from your analysis
+            
+            Important: Do not use the oc_logs tool as it requires cluster 
+            access. Focus on analyzing the provided log content and using 
+            the search_jira_issues tool for Jira integration.
+            
+            Log diff:
+            """
+
+
+def pop_flag(argv, flag):
+    """Remove a boolean flag from argv, returning whether it was set"""
+    if flag in argv:
+        argv.remove(flag)
+        return True
+    return False
+
+
+def pop_option(argv, option, default=None):
+    """Remove an option and its value from argv, returning the value"""
+    if option in argv:
+        index = argv.index(option)
+        if index + 1 < len(argv):
+            value = argv[index + 1]
+            del argv[index:index + 2]
+            return value
+        argv.remove(option)
+    return default
+
+
+def analysis_prompt(project_key=None):
+    prompt = ANALYZE_PROMPT
+    if project_key and check_jira_config():
+        prompt += f"\n\nAdditionally, search for related Jira issues in project '{project_key}' that might be related to this failure."
+    return prompt
+
+
+def render_stream(events):
+    """Print a streaming query live, tokens as they arrive and tool calls
+    as they happen, and return it shaped like a /v1/query response."""
+    print('------------------------------------------->')
+    tokens = []
+    tool_calls = {}
+    response = {"tool_results": []}
+    for event, data in events:
+        match event:
+            case "token":
+                token = data.get("token", "")
+                tokens.append(token)
+                print(token, end="", flush=True)
+            case "tool_call":
+                tool_calls[data.get("id")] = data.get("name", "Tool")
+                print(f"\n[calling {data.get('name', 'Tool')} "
+                      f"{json.dumps(data.get('args', {}))}]", flush=True)
+            case "tool_result":
+                tool_result = dict(data)
+                tool_result.setdefault(
+                    "name", tool_calls.get(data.get("id"), "Tool"))
+                response["tool_results"].append(tool_result)
+                print(f"[{tool_result['name']} "
+                      f"{tool_result.get('status', 'done')}]", flush=True)
+            case "end":
+                response.update(data)
+    print()
+    response["response"] = "".join(tokens)
+    return response
+
+
+def print_response(response, streamed=False):
+    """Print the main response followed by any successful tool results,
+    the main response was already printed when streamed"""
+    main_response = response.get("response", "")
+    if main_response and not streamed:
+        print('------------------------------------------->\n'
+              + main_response)
+
+    tool_results = response.get("tool_results", [])
+    if tool_results:
+        print("\n" + "="*50)
+        print("TOOL RESULTS:")
+        print("="*50)
+        for tool_result in tool_results:
+            if tool_result.get("status") == "success":
+                content = tool_result.get("content", "")
+                if content:
+                    print(f"\n{tool_result.get('name', 'Tool')} "
+                          f"Result:")
+                    print("-" * 30)
+                    print(content)
+                    print("-" * 30)
+
+
+def find_logs(target):
+    """Expand a directory or glob pattern into a sorted list of logfiles"""
+    if os.path.isdir(target):
+        target = os.path.join(target, "*")
+    return sorted(path for path in glob.glob(target) if os.path.isfile(path))
+
+
+def collect_diff(blocks, max_bytes=MAX_DIFF_BYTES, echo=True):
+    """Consume streamed anomaly blocks until max_bytes is reached.
+
+    Blocks are printed as they arrive when echo is set. Once the budget is
+    exhausted the stream is closed, which stops the logjuicer process or,
+    when the diff is cached, leaves it to finish the diff into the cache in
+    the background.
+    """
+    collected = []
+    size = 0
+    try:
+        for block in blocks:
+            if size + len(block) > max_bytes:
+                print(f"Diff exceeds {max_bytes} bytes, truncated after "
+                      f"{len(collected)} anomaly blocks")
+                collected.append(block[:max_bytes - size])
+                collected.append("\n[diff truncated]\n")
+                break
+            collected.append(block)
+            size += len(block)
+            if echo:
+                print(block, end="", flush=True)
+    finally:
+        blocks.close()
+    return "".join(collected)
+
+
+def juice_log(logfile, juicer_options, max_bytes=MAX_DIFF_BYTES, echo=False):
+    """Run logjuicer for one logfile, executed in a worker process.
+
+    Returns the diff record of the analysis, its diff is None when
+    logjuicer failed. With caching enabled, a diff of the same inputs in
+    the analysis history is reused.
+    """
+    from logjuicer import LogJuicer, LogJuicerError, log_digest
+
+    start = time.monotonic()
+    juicer = LogJuicer(logfile, **juicer_options)
+    analysis = {"logfile": logfile, "logtype": juicer.logtype,
+                "baselines": juicer.baselines, "log_hash": None,
+                "diff_key": None}
+    try:
+        analysis["log_hash"] = log_digest(logfile)
+        analysis["diff_key"] = diff_key(juicer, max_bytes)
+    except OSError:
+        # Missing inputs are reported by logjuicer
+        pass
+    with span("diff", logfile=logfile, logtype=juicer.logtype) as attrs:
+        logdiff = None
+        if analysis["diff_key"] and juicer_options.get("cache", True):
+            logdiff = AnalysisStore().diff(analysis["diff_key"])
+            count("analysis_history", stage="diff",
+                  result="miss" if logdiff is None else "hit")
+        if logdiff is not None:
+            print("Using diff from analysis history for", logfile)
+            if echo:
+                print(logdiff, end="")
+        else:
+            if echo:
+                print("Streaming diff from baseline for logtype",
+                      juicer.logtype)
+            try:
+                logdiff = collect_diff(juicer.juice_stream(), max_bytes, echo)
+            except LogJuicerError as e:
+                print(f"Error during logjuicer execution: {e}")
+        analysis["diff"] = logdiff
+        analysis["diff_seconds"] = time.monotonic() - start
+        if logdiff is not None:
+            observe("diff_bytes", len(logdiff))
+            attrs["bytes"] = len(logdiff)
+    if in_worker():
+        # Handed to the parent process, see merge_metrics()
+        analysis["metrics"] = METRICS.drain()
+    return analysis
+
+
+def merge_metrics(analysis):
+    """Merge the metrics recorded by the worker process of a diff"""
+    METRICS.merge(analysis.pop("metrics", None))
+
+
+def query_analysis(client, analysis, prompt, store=None, reuse=True,
+                   token_budget=TOKEN_BUDGET, concurrency=OLS_WORKERS,
+                   stream=False, mode="analyze"):
+    """Query Lightspeed with the diff of analysis and record the result.
+
+    With reuse set, the response of an earlier analysis of the same diff
+    with the same prompt is returned from store instead.
+    """
+    start = time.monotonic()
+    response = None
+    with span("analysis", logfile=analysis["logfile"], mode=mode) as attrs:
+        if store and reuse and analysis["diff_key"]:
+            response = store.analysis(analysis["diff_key"], prompt, MODEL,
+                                      PROVIDER)
+            count("analysis_history", stage="response",
+                  result="miss" if response is None else "hit")
+        attrs["reused"] = response is not None
+        if response is not None:
+            print("Using response from analysis history for",
+                  analysis["logfile"])
+            if stream:
+                print('------------------------------------------->\n'
+                      + response["response"])
+        else:
+            response = client.query_chunked(prompt, analysis["diff"],
+                                            token_budget, concurrency,
+                                            stream=stream)
+    if store:
+        store.record(analysis, prompt, MODEL, PROVIDER, response,
+                     time.monotonic() - start, mode)
+    return response
+
+
+def print_analysis(logfile, response, representative=None):
+    """Print the analysis of logfile, response may be the query error"""
+    if representative and representative != logfile:
+        print(f"\n[{logfile}] Same failure as {representative}, analysis:")
+    else:
+        print(f"\n[{logfile}] Analysis:")
+    if isinstance(response, Exception):
+        print(f"Error: {response}")
+    else:
+        print_response(response)
+
+
+def analyze_dir(client, target, project_key=None, workers=None,
+                ols_workers=OLS_WORKERS, juicer_options=None,
+                max_bytes=MAX_DIFF_BYTES, token_budget=TOKEN_BUDGET,
+                concurrency=OLS_WORKERS, cluster=True, store=None):
+    """Analyze every logfile matched by target.
+
+    Logjuicer diffs run in a process pool sized to the cores, finished diffs
+    are handed to a smaller thread pool of Lightspeed queries and each result
+    is printed as soon as its query completes. With cluster set, logfiles
+    failing the same way are analyzed once and share the analysis. Every
+    analysis is recorded in store when given.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    logfiles = find_logs(target)
+    if not logfiles:
+        print(f"No logfiles found for {target}")
+        return
+    print(f"Analyzing {len(logfiles)} logfiles from {target}")
+    prompt = analysis_prompt(project_key)
+    juicer_options = juicer_options or {}
+    clusters = FailureClusters() if cluster else None
+    reuse = juicer_options.get("cache", True)
+    analyses = {}
+
+    def record(logfile, response):
+        if store and not isinstance(response, Exception):
+            store.record(analyses[logfile], prompt, MODEL, PROVIDER,
+                         response, 0)
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as diffs, \
+            ThreadPoolExecutor(max_workers=ols_workers) as queries:
+        juicing = {diffs.submit(juice_log, logfile, juicer_options,
+                                 max_bytes): logfile
+                   for logfile in logfiles}
+        querying = {}
+        while juicing or querying:
+            done, _ = wait(set(juicing) | set(querying),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in juicing:
+                    logfile = juicing.pop(future)
+                    try:
+                        analysis = future.result()
+                        merge_metrics(analysis)
+                    except Exception as e:
+                        analysis = {"diff": None}
+                        print(f"[{logfile}] {e}")
+                    if analysis["diff"] is None:
+                        print(f"[{logfile}] Error during logjuicer execution")
+                        continue
+                    analyses[logfile] = analysis
+                    group = None
+                    if clusters:
+                        group, new = clusters.add(logfile, analysis["diff"])
+                        if not new:
+                            if group.response is None:
+                                print(f"[{logfile}] Same failure as "
+                                      f"{group.representative}, waiting for "
+                                      f"its analysis")
+                            else:
+                                print_analysis(logfile, group.response,
+                                               group.representative)
+                                record(logfile, group.response)
+                            continue
+                    print(f"[{logfile}] Diff generated from baseline for "
+                          f"logtype {analysis['logtype']}, querying "
+                          f"Lightspeed")
+                    querying[queries.submit(
+                        query_analysis, client, analysis, prompt, store,
+                        reuse, token_budget, concurrency)] = (logfile, group)
+                else:
+                    logfile, group = querying.pop(future)
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        response = e
+                    if group is None:
+                        print_analysis(logfile, response)
+                        continue
+                    group.response = response
+                    for member in group.members:
+                        print_analysis(member, response, logfile)
+                        if member != logfile:
+                            record(member, response)
+
+    if clusters:
+        print(f"\nAnalyzed {len(clusters.clusters)} distinct failures "
+              f"for {len(logfiles)} logfiles")
+
+
+def print_history(args, since=None, limit=20):
+    """history [logfile|logtype], history show <id> or history trend"""
+    store = AnalysisStore()
+    since = float(since) * 24 * 3600 if since else None
+    if args[:1] == ['show'] and len(args) == 2:
+        analysis = store.get(int(args[1]))
+        if analysis is None:
+            print(f"No analysis {args[1]}")
+            return
+        analysis["prompt"] = analysis["prompt"].strip()
+        for name in ("baselines", "tool_results", "jira_keys"):
+            analysis[name] = json.loads(analysis[name])
+        print(json.dumps(analysis, indent=2))
+        return
+    if args[:1] == ['trend']:
+        for row in store.trend(since):
+            print(f"{row['day']}  {row['logtype']:<20} "
+                  f"{row['analyses']:>5} analyses {row['logs']:>5} logs  "
+                  f"{' '.join(row['jira_keys'])}")
+        return
+    for row in store.history(args[0] if args else None, since, limit):
+        created = time.strftime("%Y-%m-%d %H:%M",
+                                time.localtime(row["created"]))
+        summary = " ".join(row["response"].split())[:80]
+        print(f"{row['id']:>6}  {created}  {row['logtype']:<12} "
+              f"{row['logfile']}  diff {row['diff_seconds'] or 0:.1f}s "
+              f"query {row['query_seconds'] or 0:.1f}s  "
+              f"{' '.join(json.loads(row['jira_keys']))}\n        {summary}")
+
+
+def run_on_daemon(url, mode, targets, project_key=None, query=None,
+                  **options):
+    """Submit the analyses to a running triage daemon and print the results.
+
+    The daemon keeps the Lightspeed connection and caches warm, this
+    process only submits jobs and follows their progress. Logfiles are
+    sent as absolute paths, the daemon runs in another directory.
+    """
+    from daemon import DaemonClient
+    from logjuicer import split_member
+
+    def absolute(target):
+        if target is None:
+            return None
+        archive, member = split_member(target)
+        if member is None:
+            return os.path.abspath(target)
+        return f"{os.path.abspath(archive)}:{member}"
+
+    targets = [absolute(target) for target in targets]
+    daemon = DaemonClient(url)
+    jobs = [daemon.submit(mode=mode, logfile=target, project_key=project_key,
+                          query=query, **options)
+            for target in targets]
+    for job in jobs:
+        job = daemon.wait(job["id"])
+        if job["status"] == "failed":
+            print(f"Error: {job['error']}")
+        elif len(jobs) > 1:
+            print_analysis(job["logfile"], job["result"])
+        else:
+            print_response(job["result"])
+
+
 if __name__ == "__main__":
+    juicer_options = {
+        "cache": not pop_flag(sys.argv, "--no-cache"),
+        "all_baselines": pop_flag(sys.argv, "--all-baselines"),
+        "ocp_version": pop_option(sys.argv, "--ocp-version"),
+        "prefilter": pop_flag(sys.argv, "--prefilter"),
+    }
+    max_bytes = int(pop_option(sys.argv, "--max-diff-bytes", MAX_DIFF_BYTES))
+    token_budget = int(pop_option(sys.argv, "--token-budget", TOKEN_BUDGET))
+    concurrency = int(pop_option(sys.argv, "--concurrency", OLS_WORKERS))
+    stream = pop_flag(sys.argv, "--stream")
+    cluster = not pop_flag(sys.argv, "--no-cluster")
+    fuzzy_cache = pop_flag(sys.argv, "--fuzzy-cache")
+    daemon_url = pop_option(sys.argv, "--daemon",
+                            os.environ.get("LIGHTSPEED_AGENT_DAEMON"))
+    trace = pop_option(sys.argv, "--trace")
+    profile = pop_option(sys.argv, "--profile")
+    if trace:
+        trace_to(trace)
+    if profile:
+        profile_to(profile)
+    if sys.argv[1:] == ['cache-stats']:
+        print(json.dumps(ResponseCache().stats(), indent=2))
+        sys.exit(0)
+    if sys.argv[1:2] == ['history']:
+        since = pop_option(sys.argv, "--since")
+        limit = int(pop_option(sys.argv, "--limit", 20))
+        print_history(sys.argv[2:], since, limit)
+        sys.exit(0)
     if len(sys.argv) < 3:
         print("Usage help:\n\
         python agent.py ask <query>\n\
         python agent.py analyze <logfile> [project_key]\n\
-        python agent.py analyze-with-jira <logfile> <project_key>")
+        python agent.py analyze-dir <directory|glob> [project_key]\n\
+        python agent.py analyze-with-jira <logfile> <project_key>\n\
+        python agent.py cache-stats\n\
+        python agent.py history [logfile|logtype] [--since <days>] [--limit <n>]\n\
+        python agent.py history show <id>\n\
+        python agent.py history trend [--since <days>]\n\
+        Options:\n\
+        --no-cache              do not reuse cached diffs and responses\n\
+        --fuzzy-cache           reuse responses of near-duplicate queries\n\
+        --ocp-version <version> prefer baselines of this OCP version\n\
+        --all-baselines         diff against every baseline of the logtype\n\
+        --prefilter             drop ignore_patterns lines before diffing\n\
+        --max-diff-bytes <n>    cut the diff off after n bytes\n\
+        --token-budget <n>      map-reduce diffs over n tokens per query\n\
+        --concurrency <n>       concurrent chunk queries per analysis\n\
+        --stream                print the response as it is generated\n\
+        --no-cluster            analyze-dir analyzes duplicate failures too\n\
+        --daemon <url>          run the analysis on a triage daemon\n\
+        --trace <file>          write a JSON trace of every stage to file\n\
+        --profile <file>        write cProfile stats of the run to file")
         sys.exit(1)
+
+    if daemon_url:
+        mode = sys.argv[1]
+        if mode == 'analyze-dir':
+            mode, targets = 'analyze', find_logs(sys.argv[2])
+        elif mode == 'ask':
+            targets = [None]
+        else:
+            targets = [sys.argv[2]]
+        run_on_daemon(daemon_url, mode, targets,
+                      project_key=sys.argv[3] if mode != 'ask' and
+                      len(sys.argv) > 3 else None,
+                      query=" ".join(sys.argv[2:]) if mode == 'ask' else None,
+                      juicer_options=juicer_options, max_bytes=max_bytes,
+                      token_budget=token_budget, concurrency=concurrency)
+        sys.exit(0)
     
-    client = OLSClient("http://0.0.0.0:8080")
-    if client:
-        print("Connected to Lightspeed Service")
-    
-    # Check Jira configuration
-    jira_enabled = check_jira_config()
+    cache = None
+    if juicer_options["cache"]:
+        cache = ResponseCache(fuzzy=fuzzy_cache)
+    client = OLSClient("http://0.0.0.0:8080", cache=cache)
+    # Probed while the logs are diffed
+    client.check_health()
+    store = AnalysisStore()
     
     match sys.argv[1]:
         case 'ask':
             query = " ".join(sys.argv[2:])
             print("Asking Openshift Lightspeed Service")
             try:
-                response = client.query(query)
-                print("Response:", json.dumps(response, indent=2))
-                
-                # Display the main response
-                main_response = response.get("response", "")
-                if main_response:
-                    print('------------------------------------------->\n' 
-                          + main_response)
-                
-                # Display tool results if available
-                tool_results = response.get("tool_results", [])
-                if tool_results:
-                    print("\n" + "="*50)
-                    print("TOOL RESULTS:")
-                    print("="*50)
-                    for tool_result in tool_results:
-                        if tool_result.get("status") == "success":
-                            content = tool_result.get("content", "")
-                            if content:
-                                print(f"\n{tool_result.get('name', 'Tool')} "
-                                      f"Result:")
-                                print("-" * 30)
-                                print(content)
-                                print("-" * 30)
+                response = client.query(query, stream=stream)
+                if not stream:
+                    print("Response:", json.dumps(response, indent=2))
+                print_response(response, streamed=stream)
                 
             except Exception as e:
                 print(f"Error: {e}")
@@ -100,53 +1039,29 @@ if __name__ == "__main__":
             project_key = sys.argv[3] if len(sys.argv) > 3 else None
             
             print("Analyzing logfile", filename)
-            juicer = LogJuicer(filename)
-            logdiff = juicer.juice()
-            if logdiff is None:
-                print("Error during logjuicer execution")
+            analysis = juice_log(filename, juicer_options, max_bytes,
+                                 echo=True)
+            if analysis["diff"] is None:
                 sys.exit(1)
-            print("Diff generated from baseline for logtype\n",
-                  juicer.logtype, logdiff)
             
-            prompt = """This is a log diff of a failure in an OS latency,\
-            network latency or other performance related test,\
-            analyze this log, write a triage summary describing failure and \
-            give the exact path to relevant must-gather log files\n\
-                """
-            
-            if project_key and jira_enabled:
-                prompt += f"\n\nAdditionally, search for related Jira issues in project '{project_key}' that might be related to this failure."
-            
-            query = prompt + logdiff
-
             try:
-                response = client.query(query)
-                
-                # Display the main response
-                main_response = response.get("response", "")
-                if main_response:
-                    print('------------------------------------------->\n' 
-                          + main_response)
-                
-                # Display tool results if available
-                tool_results = response.get("tool_results", [])
-                if tool_results:
-                    print("\n" + "="*50)
-                    print("TOOL RESULTS:")
-                    print("="*50)
-                    for tool_result in tool_results:
-                        if tool_result.get("status") == "success":
-                            content = tool_result.get("content", "")
-                            if content:
-                                print(f"\n{tool_result.get('name', 'Tool')} "
-                                      f"Result:")
-                                print("-" * 30)
-                                print(content)
-                                print("-" * 30)
+                response = query_analysis(
+                    client, analysis, analysis_prompt(project_key), store,
+                    juicer_options["cache"], token_budget, concurrency,
+                    stream=stream)
+                print_response(response, streamed=stream)
                 
             except Exception as e:
                 print(f"Error: {e}")
         
+        case 'analyze-dir':
+            target = sys.argv[2]
+            project_key = sys.argv[3] if len(sys.argv) > 3 else None
+            analyze_dir(client, target, project_key,
+                        juicer_options=juicer_options, max_bytes=max_bytes,
+                        token_budget=token_budget, concurrency=concurrency,
+                        cluster=cluster, store=store)
+
         case 'analyze-with-jira':
             if len(sys.argv) < 4:
                 print("Usage: python agent.py analyze-with-jira <logfile> <project_key>")
@@ -156,37 +1071,18 @@ if __name__ == "__main__":
             project_key = sys.argv[3]
             
             print(f"Analyzing logfile {filename} with Jira integration for project {project_key}")
-            juicer = LogJuicer(filename)
-            logdiff = juicer.juice()
-            if logdiff is None:
-                print("Error during logjuicer execution")
+            analysis = juice_log(filename, juicer_options, max_bytes,
+                                 echo=True)
+            if analysis["diff"] is None:
                 sys.exit(1)
-            print("Diff generated from baseline for logtype\n",
-                  juicer.logtype, logdiff)
-            
-            prompt = f"""This is a log diff of a failure in an OS latency,\
-            network latency or other performance related test.\
-            
-            Please:
-            1. Analyze this log and write a triage summary describing the 
-               failure
-            2. Give the exact path to relevant must-gather log files based 
-               on the log content (do not use oc_logs tool)
-            3. Use the search_jira_issues tool to find related Jira issues 
-               in project '{project_key}' that might be related to this failure
-            4. Present the Jira search results separately from your analysis
-            
-            Important: Do not use the oc_logs tool as it requires cluster 
-            access. Focus on analyzing the provided log content and using 
-            the search_jira_issues tool for Jira integration.
-            
-            Log diff:
-            """
             
-            query = prompt + logdiff
+            prompt = jira_prompt(project_key, analysis["diff"])
 
             try:
-                response = client.query(query)
+                response = query_analysis(
+                    client, analysis, prompt, store, juicer_options["cache"],
+                    token_budget, concurrency, stream=stream,
+                    mode='analyze-with-jira')
                 
                 # Debug: Print the full response structure for analyze-with-jira
                 print("DEBUG: Full response structure:")
@@ -197,7 +1093,7 @@ if __name__ == "__main__":
                 
                 # Display the main response
                 main_response = response.get("response", "")
-                if main_response:
+                if main_response and not stream:
                     print('------------------------------------------->\n' 
                           + main_response)
                 
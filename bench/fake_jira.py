@@ -0,0 +1,173 @@
+"""Stand-in for the Jira REST API used by mcp-servers/jira.py.
+
+Serves a deterministic corpus of issues per project through
+/rest/api/2/search (the project and the summary ~ "text" clauses of the
+JQL are honored, startAt and maxResults paginate and fields projects), /rest/api/2/issue/<key>,
+/rest/api/2/project and /rest/api/2/project/<key>. Every rate_limit_every-th request is answered
+with a 429 and a Retry-After header to exercise the client retries.
+"""
+
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT = 8081
+LATENCY = 0.05
+ISSUES = 2000
+PROJECTS = ["OCPBUGS", "CNF"]
+SEED = 42
+DESCRIPTION_WORDS = 300
+
+SUBJECTS = ["oslat", "cyclictest", "hwlatdetect", "ptp4l", "phc2sys",
+            "kubelet", "cri-o", "tuned", "irqbalance", "sriov", "ovn",
+            "topology manager", "cpu manager", "performance profile"]
+PROBLEMS = ["maximum latency exceeds threshold", "soft lockup",
+            "failed to allocate cpus", "timed out while polling",
+            "cannot change IRQ affinity", "offset spikes", "pod admission error",
+            "high jitter on isolated cpus", "profile not applied", "oom kill"]
+STATUSES = ["New", "ASSIGNED", "POST", "MODIFIED", "ON_QA", "Verified",
+            "Closed"]
+PEOPLE = ["Ada Lovelace", "Alan Turing", "Grace Hopper", "Linus Torvalds",
+          "Margaret Hamilton", "Ken Thompson"]
+
+
+def build_corpus(issues=ISSUES, seed=SEED):
+    rng = random.Random(seed)
+    corpus = {}
+    for project in PROJECTS:
+        for number in range(1, issues + 1):
+            summary = f"{rng.choice(SUBJECTS)}: {rng.choice(PROBLEMS)} on " \
+                      f"OCP 4.{rng.randrange(12, 20)}"
+            description = " ".join(
+                rng.choice(SUBJECTS + PROBLEMS)
+                for _ in range(rng.randrange(DESCRIPTION_WORDS)))
+            day = f"2025-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}"
+            key = f"{project}-{number}"
+            corpus[key] = {
+                "id": str(len(corpus) + 10000), "key": key,
+                "fields": {
+                    "summary": summary, "description": description,
+                    "status": {"name": rng.choice(STATUSES)},
+                    "assignee": {"displayName": rng.choice(PEOPLE)},
+                    "reporter": {"displayName": rng.choice(PEOPLE)},
+                    "created": day + "T08:00:00.000+0000",
+                    "updated": day + "T18:00:00.000+0000",
+                }}
+    return corpus
+
+
+class Handler(BaseHTTPRequestHandler):
+    corpus = {}
+    latency = LATENCY
+    rate_limit_every = 0
+    requests = 0
+    lock = threading.Lock()
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def throttled(self):
+        time.sleep(self.latency)
+        with Handler.lock:
+            Handler.requests += 1
+            limited = self.rate_limit_every and \
+                Handler.requests % self.rate_limit_every == 0
+        if limited:
+            self.send_json(429, {"errorMessages": ["Rate limit exceeded"]},
+                           {"Retry-After": "1"})
+        return limited
+
+    def do_GET(self):
+        if self.throttled():
+            return
+        path = self.path.split("?")[0]
+        projects = [{"id": str(i), "key": key, "name": key}
+                    for i, key in enumerate(PROJECTS + ["RHEL"])]
+        if path == "/rest/api/2/project":
+            self.send_json(200, projects)
+        elif path.startswith("/rest/api/2/project/"):
+            key = path.rsplit("/", 1)[1]
+            project = next((project for project in projects
+                            if project["key"] == key), None)
+            if project:
+                self.send_json(200, project)
+            else:
+                self.send_json(404, {"errorMessages": ["No project"]})
+        elif path.startswith("/rest/api/2/issue/"):
+            issue = self.corpus.get(path.rsplit("/", 1)[1])
+            if issue:
+                self.send_json(200, issue)
+            else:
+                self.send_json(404, {"errorMessages": ["Issue does not exist"]})
+        else:
+            self.send_json(404, {"errorMessages": ["Not found"]})
+
+    def do_POST(self):
+        if self.throttled():
+            return
+        if self.path.split("?")[0] != "/rest/api/2/search":
+            self.send_json(404, {"errorMessages": ["Not found"]})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        jql = payload.get("jql", "")
+        project = re.search(r'project\s*=\s*"?([\w-]+)"?', jql)
+        text = re.search(r'summary\s*~\s*"([^"]*)"', jql)
+        words = re.findall(r"\w+", text.group(1).lower()) if text else []
+        matches = [issue for key, issue in self.corpus.items()
+                   if (not project or key.startswith(project.group(1) + "-"))
+                   and all(word in (issue["fields"]["summary"] + " " +
+                                    issue["fields"]["description"]).lower()
+                           for word in words)]
+        matches.sort(key=lambda issue: issue["fields"]["updated"],
+                     reverse="ASC" not in jql.upper())
+        start_at = int(payload.get("startAt", 0))
+        max_results = int(payload.get("maxResults", 50))
+        issues = matches[start_at:start_at + max_results]
+        fields = payload.get("fields")
+        if fields:
+            issues = [dict(issue, fields={name: value for name, value in
+                                          issue["fields"].items()
+                                          if name in fields})
+                      for issue in issues]
+        self.send_json(200, {
+            "startAt": start_at, "maxResults": max_results,
+            "total": len(matches), "issues": issues})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=PORT, latency=LATENCY, issues=ISSUES, rate_limit_every=0):
+    Handler.corpus = build_corpus(issues)
+    Handler.latency = latency
+    Handler.rate_limit_every = rate_limit_every
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    print(f"Fake Jira on http://127.0.0.1:{port} ({len(Handler.corpus)} "
+          f"issues, {latency}s latency)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 5 or sys.argv[1:2] in (["-h"], ["--help"]):
+        print("Usage help:\n\
+        python bench/fake_jira.py [port] [latency] [issues_per_project] \
+[rate_limit_every]")
+        sys.exit(1)
+    types = (int, float, int, int)
+    serve(*(cast(arg) for cast, arg in zip(types, sys.argv[1:])))
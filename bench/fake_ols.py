@@ -0,0 +1,107 @@
+"""Stand-in for lightspeed-service and the model behind it.
+
+Answers /v1/query after a fixed latency plus the time to generate the
+response at token_rate tokens per second, /v1/streaming_query streams the
+same tokens as they are "generated". Responses mention a Jira key so that
+downstream parsing has something to find.
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT = 8080
+LATENCY = 0.2
+TOKEN_RATE = 200.0
+TOKENS = 300
+WORDS = ("The oslat test failed on cnfdg15 because the maximum latency "
+         "exceeded the threshold, see OCPBUGS-12345 and the must-gather "
+         "file namespaces/openshift-cluster-node-tuning-operator/pods/"
+         "tuned/logs/current.log for the applied profile.").split()
+
+
+class Handler(BaseHTTPRequestHandler):
+    latency = LATENCY
+    token_rate = TOKEN_RATE
+    tokens = TOKENS
+    served = 0
+    lock = threading.Lock()
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path in ("/v1/query", "/readiness", "/liveness"):
+            self.send_json(200, {"ready": True, "reason": "service is ready"})
+        else:
+            self.send_json(404, {"detail": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        query = json.loads(self.rfile.read(length) or b"{}").get("query", "")
+        with Handler.lock:
+            Handler.served += 1
+            conversation_id = f"conversation-{Handler.served}"
+        words = [WORDS[i % len(WORDS)] for i in range(self.tokens)]
+        time.sleep(self.latency)
+        if self.path == "/v1/query":
+            time.sleep(len(words) / self.token_rate)
+            self.send_json(200, {
+                "conversation_id": conversation_id,
+                "response": " ".join(words),
+                "tool_results": [],
+                "input_tokens": len(query) // 4,
+                "output_tokens": len(words),
+            })
+        elif self.path == "/v1/streaming_query":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.event("start", {"conversation_id": conversation_id})
+            for index, word in enumerate(words):
+                time.sleep(1 / self.token_rate)
+                self.event("token", {"id": index, "token": word + " "})
+            self.event("end", {"input_tokens": len(query) // 4,
+                               "output_tokens": len(words)})
+            self.close_connection = True
+        else:
+            self.send_json(404, {"detail": "not found"})
+
+    def event(self, event, data):
+        self.wfile.write(b"data: " + json.dumps(
+            {"event": event, "data": data}).encode() + b"\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=PORT, latency=LATENCY, token_rate=TOKEN_RATE, tokens=TOKENS):
+    Handler.latency = latency
+    Handler.token_rate = token_rate
+    Handler.tokens = tokens
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    print(f"Fake lightspeed-service on http://127.0.0.1:{port} "
+          f"({latency}s latency, {token_rate} tokens/s, {tokens} tokens)",
+          flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 5 or sys.argv[1:2] in (["-h"], ["--help"]):
+        print("Usage help:\n\
+        python bench/fake_ols.py [port] [latency] [token_rate] [tokens]")
+        sys.exit(1)
+    types = (int, float, float, int)
+    serve(*(cast(arg) for cast, arg in zip(types, sys.argv[1:])))
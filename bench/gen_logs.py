@@ -0,0 +1,138 @@
+"""Synthetic baselines and failing logs for the benchmarks.
+
+For every size a baseline baselines/synth<size>.log and a failing log
+synth<size>_failure.log are written to the output directory, along with a
+copy of logjuicer.yaml, so that the directory can be used as the working
+directory of agent.py. Output is deterministic for a given seed.
+"""
+
+import os
+import random
+import shutil
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO, "bench", "data")
+SIZES = "1M,10M,100M,1G"
+SEED = 42
+# Roughly one anomaly every ANOMALY_EVERY lines of the failing log
+ANOMALY_EVERY = 2000
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+NODES = [f"cnfdg{i}" for i in range(10, 40)]
+PODS = ["oslat-runner", "cyclictest-runner", "hwlatdetect", "ptp-daemon",
+        "tuned", "sriov-network-config-daemon"]
+NORMAL = [
+    "{time} {node} oslat[{pid}]: Core {cpu}: Maximum latency: {small} us",
+    "{time} {node} oslat[{pid}]: Core {cpu}: Minimum latency: 1 us",
+    "{time} {node} kubelet[{pid}]: Pod {pod}-{pid} container started",
+    "{time} {node} tuned[{pid}]: applying profile openshift-node-performance",
+    "{time} {node} crio[{pid}]: Pulled image quay.io/openshift/{pod}:4.18",
+    "{time} {node} cyclictest[{pid}]: T:{cpu} P:95 I:1000 C:{count} Max: {small}",
+    "{time} {node} ptp4l[{pid}]: rms {small} max {small} freq -{count} delay 512",
+]
+NOISE = [
+    "{time} RAN_METRICS cpu={cpu} value={count}",
+    "{time} jenkins pipeline_stage=run-tests step={count}",
+    "  % Total    % Received % Xferd  Average Speed   Time    Time     Time  Current",
+    "100 {count}  100 {count}    0     0  {count}      0 --:--:-- --:--:-- --:--:-- {count}",
+]
+ANOMALIES = [
+    "{time} {node} oslat[{pid}]: FAIL: Core {cpu}: Maximum latency: {large} us exceeds threshold 20 us",
+    "{time} {node} kubelet[{pid}]: error: failed to allocate cpus for {pod}: topology manager admission error",
+    "{time} {node} kernel: NMI watchdog: BUG: soft lockup - CPU#{cpu} stuck for {small}s",
+    "{time} {node} ptp4l[{pid}]: timed out while polling for tx timestamp, offset {large} ns",
+    "{time} {node} irqbalance[{pid}]: Cannot change IRQ {count} affinity: Input/output error",
+    "--- FAIL: TestLatency/oslat_{cpu} ({small}.{count}s)",
+]
+
+
+def parse_size(size):
+    size = size.strip().upper().rstrip("B")
+    if size and size[-1] in UNITS:
+        return int(float(size[:-1]) * UNITS[size[-1]])
+    return int(size)
+
+
+def render(rng, template, second):
+    return template.format(
+        time=f"2025-06-01T{second // 3600 % 24:02d}:{second // 60 % 60:02d}:"
+             f"{second % 60:02d}.{rng.randrange(1000000):06d}Z",
+        node=rng.choice(NODES), pod=rng.choice(PODS),
+        pid=rng.randrange(1000, 65000), cpu=rng.randrange(64),
+        count=rng.randrange(100000), small=rng.randrange(2, 15),
+        large=rng.randrange(100, 5000)) + "\n"
+
+
+def write_log(path, size, seed, anomalies=False):
+    """Write about size bytes of log lines to path in 1 MiB blocks"""
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    written = 0
+    line = 0
+    with open(path, "w") as f:
+        while written < size:
+            block = []
+            block_size = 0
+            while block_size < min(1 << 20, size - written):
+                line += 1
+                if anomalies and rng.randrange(ANOMALY_EVERY) == 0:
+                    template = rng.choice(ANOMALIES)
+                elif rng.randrange(10) == 0:
+                    template = rng.choice(NOISE)
+                else:
+                    template = rng.choice(NORMAL)
+                text = render(rng, template, line // 50)
+                block.append(text)
+                block_size += len(text)
+            f.write("".join(block))
+            written += block_size
+    return written
+
+
+def synthetic_diff(size, seed=SEED):
+    """A logjuicer style diff of about size bytes, for the stages after the
+    diff when no logjuicer binary is available"""
+    rng = random.Random(seed)
+    blocks = []
+    total = 0
+    line = 0
+    while total < size:
+        block = []
+        for _ in range(rng.randrange(1, 6)):
+            line += rng.randrange(1, 500)
+            block.append(f"{line:>8} | " + render(
+                rng, rng.choice(ANOMALIES + NORMAL), line // 50))
+        block = "".join(block) + "\n"
+        blocks.append(block)
+        total += len(block)
+    return "".join(blocks)
+
+
+def generate(sizes=SIZES, out=DATA_DIR, seed=SEED, force=False):
+    """Generate the logs of every size not generated yet, returns the
+    (logfile, size) pairs relative to out"""
+    os.makedirs(out, exist_ok=True)
+    shutil.copy(os.path.join(REPO, "logjuicer.yaml"),
+                os.path.join(out, "logjuicer.yaml"))
+    logs = []
+    for size in sizes.split(","):
+        name = "synth" + size.strip().lower()
+        baseline = os.path.join("baselines", name + ".log")
+        logfile = name + "_failure.log"
+        for path, anomalies, offset in ((baseline, False, 0),
+                                        (logfile, True, 1)):
+            target = os.path.join(out, path)
+            if force or not os.path.exists(target):
+                print(f"Writing {target}")
+                write_log(target, parse_size(size), seed + offset, anomalies)
+        logs.append((logfile, parse_size(size)))
+    return logs
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 or sys.argv[1:2] in (["-h"], ["--help"]):
+        print("Usage help:\n\
+        python bench/gen_logs.py [sizes, default 1M,10M,100M,1G] [out_dir]")
+        sys.exit(1)
+    generate(*sys.argv[1:])
@@ -0,0 +1,345 @@
+"""End-to-end benchmark of the agent against local stand-ins.
+
+Generates synthetic logs, starts the fake lightspeed-service and Jira
+servers and times every stage of an analysis: hashing, pre-filtering and
+diffing the logs, building prompts, querying Lightspeed and searching and
+formatting Jira issues. Each stage reports latency percentiles, throughput
+and the peak RSS of the benchmark and of its largest reaped child process
+so far. The peaks are cumulative over the run, a stage only raises them
+when it used more memory than every stage before it.
+"""
+
+import asyncio
+import contextlib
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(BENCH)
+sys.path.insert(0, REPO)
+sys.path.insert(0, BENCH)
+
+import agent  # noqa: E402
+import fake_jira  # noqa: E402
+import gen_logs  # noqa: E402
+import logjuicer  # noqa: E402
+from agent import pop_flag, pop_option  # noqa: E402
+from signatures import extract_signatures, load_jira, search_terms  # noqa: E402
+
+STAGES = "digest,prefilter,diff,prompt,http,jira"
+SIZES = "1M,10M"
+REPS = 3
+QUERIES = 50
+OLS_PORT = 18080
+JIRA_PORT = 18081
+# Size of the synthetic diff used when no logjuicer binary is available
+DIFF_BYTES = 64 * 1024
+PROJECT = "OCPBUGS"
+# Issues of the broad, paginated Jira search
+BROAD_RESULTS = 500
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile"""
+    ranked = sorted(samples)
+    return ranked[max(0, math.ceil(p / 100 * len(ranked)) - 1)]
+
+
+def peak_rss():
+    """Peak RSS in MiB of this process and of its largest waited for child
+    since the benchmark started, not of the last stage alone"""
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024)
+
+
+def summarize(stage, samples, amount=None, unit=None, wall=None):
+    """Latency percentiles of samples, throughput as amount per second of
+    wall time, the summed samples when the stage ran sequentially"""
+    wall = wall or sum(samples)
+    result = {"stage": stage, "n": len(samples),
+              "p50": percentile(samples, 50), "p90": percentile(samples, 90),
+              "p99": percentile(samples, 99), "max": max(samples)}
+    if amount is not None:
+        result["throughput"] = amount / wall
+        result["unit"] = unit
+    result["peak_rss_mb"], result["peak_children_rss_mb"] = peak_rss()
+    return result
+
+
+def timed(function, *args, **kwargs):
+    """Seconds function took and its result"""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def progress(message):
+    # The output of the benchmarked code goes to /dev/null
+    print(message, file=sys.stderr, flush=True)
+
+
+def concurrently(function, calls, concurrency):
+    """Run function over calls with concurrency threads, returns the
+    latency of each call and the wall time of all of them"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = [latency for latency, _ in
+                     pool.map(lambda args: timed(function, *args), calls)]
+    return latencies, time.perf_counter() - start
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+@contextlib.contextmanager
+def servers(ols_args, jira_args):
+    """Run the fake lightspeed-service and Jira in child processes"""
+    processes = [
+        subprocess.Popen([sys.executable, os.path.join(BENCH, script)]
+                         + [str(arg) for arg in args])
+        for script, args in (("fake_ols.py", ols_args),
+                             ("fake_jira.py", jira_args))]
+    try:
+        wait_ready(f"http://127.0.0.1:{ols_args[0]}/readiness")
+        wait_ready(f"http://127.0.0.1:{jira_args[0]}/rest/api/2/issue/"
+                   f"{PROJECT}-1")
+        yield
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+def bench_logs(logs, stages, reps, juicer):
+    """Digest, pre-filter and diff stages, returns the diff of each log"""
+    results = []
+    diffs = {}
+    for logfile, size in logs:
+        progress(f"Benchmarking {logfile}")
+        mib = size / (1 << 20)
+        if "digest" in stages:
+            samples = []
+            for _ in range(reps):
+                logjuicer._file_digest.cache_clear()
+                samples.append(timed(logjuicer.file_digest, logfile)[0])
+            results.append(summarize(f"digest {logfile}", samples,
+                                     mib * reps, "MiB/s"))
+        if "prefilter" in stages:
+            samples = []
+            for _ in range(reps):
+                prefilter = logjuicer.PreFilter()
+                with open(logfile, "rb") as source, \
+                        open(os.devnull, "wb") as target:
+                    samples.append(timed(prefilter.copy, source, target)[0])
+            results.append(summarize(f"prefilter {logfile}", samples,
+                                     mib * reps, "MiB/s"))
+        if "diff" in stages and juicer:
+            logjuicer.JUICER = juicer
+            samples = []
+            for _ in range(reps):
+                latency, analysis = timed(agent.juice_log, logfile,
+                                          {"cache": False})
+                samples.append(latency)
+            diffs[logfile] = analysis["diff"]
+            results.append(summarize(f"diff {logfile}", samples,
+                                     mib * reps, "MiB/s"))
+    return results, diffs
+
+
+def bench_prompts(diffs, reps, project):
+    results = []
+    for name, diff in diffs.items():
+        kib = len(diff) / 1024
+        for stage, function, args in (
+                ("signatures", extract_signatures, (diff,)),
+                ("chunking", agent.chunk_text, (diff, agent.TOKEN_BUDGET)),
+                ("jira_prompt", agent.jira_prompt, (project, diff))):
+            samples = [timed(function, *args)[0] for _ in range(reps)]
+            results.append(summarize(f"{stage} {name}", samples,
+                                     kib * reps, "KiB/s"))
+    return results
+
+
+def bench_http(url, diffs, queries, concurrency):
+    client = agent.OLSClient(url, cache=None)
+    diff = next(iter(diffs.values()))
+    prompt = agent.analysis_prompt()
+    latencies, wall = concurrently(
+        client.query, [(prompt + diff[:4096],)] * queries, concurrency)
+    results = [summarize("ols query", latencies, queries, "queries/s", wall)]
+    latencies, wall = concurrently(
+        lambda query: client.query(query, stream=True),
+        [(prompt + diff[:4096],)] * queries, concurrency)
+    results.append(summarize("ols streaming query", latencies, queries,
+                             "queries/s", wall))
+    for name, diff in diffs.items():
+        latency, _ = timed(client.query_chunked, prompt, diff,
+                           agent.TOKEN_BUDGET, concurrency)
+        results.append(summarize(f"ols chunked {name}", [latency],
+                                 len(diff) / 1024, "KiB/s"))
+    return results
+
+
+async def gathered(function, calls, concurrency):
+    """Await function over calls, concurrency at a time, returns the
+    latency of each call and the wall time of all of them"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed_call(args):
+        async with semaphore:
+            start = time.perf_counter()
+            await function(*args)
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*map(timed_call, calls))
+    return latencies, time.perf_counter() - start
+
+
+async def bench_jira_async(jira, url, terms, queries, reps, concurrency,
+                           project):
+    results = []
+    calls = [(project, terms[i % len(terms)], 50) for i in range(queries)]
+    async with jira.JiraClient(url, os.environ["JIRA_TOKEN"]) as client:
+        latencies, wall = await gathered(client.search_issues, calls,
+                                         concurrency)
+        results.append(summarize("jira search", latencies, queries,
+                                 "searches/s", wall))
+        latencies, wall = await gathered(
+            client.get_issue, [(f"{project}-{i + 1}",)
+                               for i in range(queries)], concurrency)
+        results.append(summarize("jira get_issue", latencies, queries,
+                                 "issues/s", wall))
+        issues = await client.search_jql(f'project = "{project}"', 100)
+        first_pages, searches = [], []
+        for _ in range(reps):
+            start = time.perf_counter()
+            async with contextlib.aclosing(client.search_pages(
+                    f'project = "{project}" ORDER BY updated DESC',
+                    BROAD_RESULTS)) as pages:
+                async for _ in pages:
+                    if len(first_pages) == len(searches):
+                        first_pages.append(time.perf_counter() - start)
+            searches.append(time.perf_counter() - start)
+        results.append(summarize("jira broad search first page",
+                                 first_pages))
+        results.append(summarize("jira broad search", searches,
+                                 BROAD_RESULTS * reps, "issues/s"))
+    # Through the shared cache, every distinct search misses once
+    latencies, wall = await gathered(jira.search_issues, calls, concurrency)
+    results.append(summarize("jira cached search", latencies, queries,
+                             "searches/s", wall))
+    await jira.close_jira_client()
+    samples = [timed(jira.format_issues, issues)[0] for _ in range(queries)]
+    results.append(summarize("jira format_issues", samples,
+                             len(issues) * queries, "issues/s"))
+    return results
+
+
+def bench_jira(url, diffs, queries, reps, concurrency, project):
+    os.environ["JIRA_BASE_URL"] = url
+    os.environ.setdefault("JIRA_TOKEN", "bench")
+    jira = load_jira()
+    terms = [term for diff in diffs.values()
+             for term in search_terms(extract_signatures(diff))] or ["oslat"]
+    return asyncio.run(bench_jira_async(jira, url, terms, queries, reps,
+                                        concurrency, project))
+
+
+def report(results):
+    print(f"\n{'stage':<36} {'n':>4} {'p50':>9} {'p90':>9} {'p99':>9} "
+          f"{'max':>9} {'throughput':>18} {'peak rss':>8} {'child':>8}")
+    for result in results:
+        throughput = f"{result['throughput']:.1f} {result['unit']}" \
+            if "throughput" in result else ""
+        print(f"{result['stage']:<36} {result['n']:>4} "
+              + " ".join(f"{result[p] * 1000:>7.1f}ms"
+                         for p in ("p50", "p90", "p99", "max"))
+              + f" {throughput:>18} {result['peak_rss_mb']:>6.0f}MB "
+              f"{result['peak_children_rss_mb']:>6.0f}MB")
+    print("peak rss and child are the peaks of the whole run so far, "
+          "not of each stage")
+
+
+if __name__ == "__main__":
+    stages = pop_option(sys.argv, "--stages", STAGES).split(",")
+    sizes = pop_option(sys.argv, "--sizes", SIZES)
+    workdir = os.path.abspath(pop_option(sys.argv, "--workdir",
+                                         gen_logs.DATA_DIR))
+    reps = int(pop_option(sys.argv, "--reps", REPS))
+    queries = int(pop_option(sys.argv, "--queries", QUERIES))
+    concurrency = int(pop_option(sys.argv, "--concurrency",
+                                 agent.OLS_WORKERS))
+    latency = pop_option(sys.argv, "--latency", 0.2)
+    token_rate = pop_option(sys.argv, "--token-rate", 200)
+    tokens = pop_option(sys.argv, "--tokens", 300)
+    jira_latency = pop_option(sys.argv, "--jira-latency", 0.05)
+    jira_issues = pop_option(sys.argv, "--jira-issues", fake_jira.ISSUES)
+    rate_limit_every = pop_option(sys.argv, "--rate-limit-every", 0)
+    juicer = pop_option(sys.argv, "--juicer", logjuicer.JUICER)
+    output = pop_option(sys.argv, "--json")
+    if output:
+        output = os.path.abspath(output)
+    regenerate = pop_flag(sys.argv, "--regenerate")
+    if len(sys.argv) > 1:
+        print("Usage help:\n\
+        python bench/run.py [--stages digest,prefilter,diff,prompt,http,jira]\n\
+        [--sizes 1M,10M,100M,1G] [--workdir <dir>] [--reps <n>]\n\
+        [--queries <n>] [--concurrency <n>] [--latency <s>]\n\
+        [--token-rate <tokens/s>] [--tokens <n>] [--jira-latency <s>]\n\
+        [--jira-issues <n>] [--rate-limit-every <n>] [--juicer <path>]\n\
+        [--json <file>] [--regenerate]")
+        sys.exit(1)
+
+    if not os.access(juicer, os.X_OK):
+        print(f"No logjuicer at {juicer}, skipping the diff stage")
+        juicer = None
+    # Keep the mirror of the user out of the Jira numbers
+    os.environ["JIRA_MIRROR_DB"] = os.path.join(workdir, "no-mirror.db")
+
+    logs = gen_logs.generate(sizes, workdir, force=regenerate)
+    os.chdir(workdir)
+    with open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        results, diffs = bench_logs(logs, stages, reps, juicer)
+        if not diffs:
+            diffs = {f"synthetic-{DIFF_BYTES // 1024}k":
+                     gen_logs.synthetic_diff(DIFF_BYTES)}
+
+        with servers((OLS_PORT, latency, token_rate, tokens),
+                     (JIRA_PORT, jira_latency, jira_issues,
+                      rate_limit_every)):
+            if "prompt" in stages:
+                progress("Benchmarking prompt building")
+                os.environ["JIRA_BASE_URL"] = f"http://127.0.0.1:{JIRA_PORT}"
+                os.environ.setdefault("JIRA_TOKEN", "bench")
+                results += bench_prompts(diffs, reps, PROJECT)
+            if "http" in stages:
+                progress("Benchmarking Lightspeed queries")
+                results += bench_http(f"http://127.0.0.1:{OLS_PORT}", diffs,
+                                      queries, concurrency)
+            if "jira" in stages:
+                progress("Benchmarking Jira")
+                results += bench_jira(f"http://127.0.0.1:{JIRA_PORT}", diffs,
+                                      queries, reps, concurrency, PROJECT)
+
+    report(results)
+    if output:
+        with open(output, "w") as f:
+            json.dump({"argv": sys.argv, "results": results}, f, indent=2)
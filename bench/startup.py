@@ -0,0 +1,138 @@
+"""Startup benchmark of agent.py.
+
+Times fresh interpreter runs of the commands that never reach Lightspeed,
+lists the slowest imports of agent and times the Lightspeed readiness probe
+against the fake lightspeed-service: probed, cached by an earlier run and
+unreachable. CI runs the CLI hundreds of times, every run pays for these.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(BENCH)
+sys.path.insert(0, REPO)
+sys.path.insert(0, BENCH)
+
+import agent  # noqa: E402
+from agent import pop_option  # noqa: E402
+from run import progress, report, summarize, timed, wait_ready  # noqa: E402
+
+REPS = 20
+OLS_PORT = 18090
+# Nothing listens there, for the unreachable probe
+CLOSED_PORT = 18099
+COMMANDS = {
+    "import agent": ["-c", "import agent"],
+    "agent.py usage": ["agent.py"],
+    "agent.py cache-stats": ["agent.py", "cache-stats"],
+    "agent.py history": ["agent.py", "history", "--limit", "1"],
+}
+IMPORT_TIME = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)")
+
+
+def run_command(args, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=REPO, env=env,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                   check=False)
+    return time.perf_counter() - start
+
+
+def bench_commands(reps, env):
+    results = []
+    for name, args in COMMANDS.items():
+        progress(f"Benchmarking {name}")
+        samples = [run_command(args, env) for _ in range(reps)]
+        results.append(summarize(name, samples, reps, "runs/s"))
+    return results
+
+
+def import_times(env, top=8):
+    """Cumulative seconds of the slowest modules agent imports directly,
+    from python -X importtime"""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                             "import agent"], cwd=REPO, env=env,
+                            capture_output=True, text=True).stderr
+    times = []
+    for line in output.splitlines():
+        match = IMPORT_TIME.match(line)
+        if not match:
+            continue
+        seconds, module = int(match.group(1)) / 1e6, match.group(3)
+        # Imports are listed after what they import, top-level ones are
+        # indented by one space and what they import directly by three
+        if len(match.group(2)) == 3:
+            times.append((seconds, module))
+        elif len(match.group(2)) == 1:
+            if module == "agent":
+                return [(seconds, module)] + \
+                    sorted(times, reverse=True)[:top]
+            times = []
+    return times
+
+
+def bench_probe(reps, url):
+    """Readiness probe of a new client, as every run makes it"""
+    results = []
+    for name, probe_url, cached in (
+            ("readiness probe", url, False),
+            ("cached readiness probe", url, True),
+            ("unreachable readiness probe",
+             f"http://127.0.0.1:{CLOSED_PORT}", False)):
+        progress(f"Benchmarking {name}")
+        samples = []
+        for _ in range(reps):
+            if not cached and os.path.exists(agent.HEALTH_CACHE):
+                os.remove(agent.HEALTH_CACHE)
+            client = agent.OLSClient(probe_url)
+            samples.append(timed(client.wait_ready)[0])
+        results.append(summarize(name, samples))
+    return results
+
+
+if __name__ == "__main__":
+    reps = int(pop_option(sys.argv, "--reps", REPS))
+    output = pop_option(sys.argv, "--json")
+    if output:
+        output = os.path.abspath(output)
+    if len(sys.argv) > 1:
+        print("Usage help:\n\
+        python bench/startup.py [--reps <n>] [--json <file>]")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Keep the caches and history of the user out of the numbers
+        env = dict(os.environ,
+                   ANALYSIS_DB=os.path.join(workdir, "analyses.db"),
+                   OLS_CACHE_DB=os.path.join(workdir, "responses.db"))
+        agent.HEALTH_CACHE = os.path.join(workdir, "health.json")
+        results = bench_commands(reps, env)
+        imports = import_times(env)
+
+        server = subprocess.Popen([sys.executable,
+                                   os.path.join(BENCH, "fake_ols.py"),
+                                   str(OLS_PORT)], stdout=subprocess.DEVNULL)
+        try:
+            url = f"http://127.0.0.1:{OLS_PORT}"
+            wait_ready(f"{url}/readiness")
+            results += bench_probe(reps, url)
+        finally:
+            server.terminate()
+            server.wait()
+
+    report(results)
+    print(f"\n{'import':<36} {'cumulative':>10}")
+    for seconds, module in imports:
+        print(f"{module:<36} {seconds * 1000:>8.1f}ms")
+    if output:
+        with open(output, "w") as f:
+            json.dump({"argv": sys.argv, "results": results,
+                       "imports": [{"module": module, "seconds": seconds}
+                                   for seconds, module in imports]},
+                      f, indent=2)
@@ -0,0 +1,113 @@
+import hashlib
+import re
+
+# MinHash signature of NUM_PERM hashes, split into BANDS for LSH lookups
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_WORDS = 5
+# Estimated Jaccard similarity above which two failures are duplicates
+SIMILARITY = 0.8
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 64) - 1
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.sha256(f"a{i}".encode()).digest()[:8], 'big')
+     | 1,
+     int.from_bytes(hashlib.sha256(f"b{i}".encode()).digest()[:8], 'big'))
+    for i in range(NUM_PERM)]
+
+NORMALIZE = [
+    # Timestamps, dates and durations
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d+)?"
+                r"(Z|[+-]\d{2}:?\d{2})?"), "<time>"),
+    (re.compile(r"\b\d{2}:\d{2}:\d{2}(\.\d+)?\b"), "<time>"),
+    # UUIDs, hex ids and addresses
+    (re.compile(r"\b[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}\b", re.I),
+     "<uuid>"),
+    (re.compile(r"\b0x[0-9a-f]+\b|\b[0-9a-f]{12,}\b", re.I), "<hex>"),
+    (re.compile(r"\b\d{1,3}(\.\d{1,3}){3}(:\d+)?\b"), "<ip>"),
+    # Hostnames, FQDNs and node names such as cnfdg15 or worker-0
+    (re.compile(r"\b[\w-]+(\.[\w-]+){2,}\b"), "<host>"),
+    (re.compile(r"\b[a-z]+(?:-[a-z]+)*-?\d+[a-z\d-]*\b", re.I), "<host>"),
+    (re.compile(r"\d+(\.\d+)?"), "<num>"),
+]
+
+
+def normalize(diff):
+    """Blank out what differs between runs of the same failure"""
+    for pattern, replacement in NORMALIZE:
+        diff = pattern.sub(replacement, diff)
+    return " ".join(diff.split())
+
+
+def fingerprint(normalized):
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def minhash(normalized):
+    words = normalized.split()
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS])
+                for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(shingle.encode(),
+                                             digest_size=8).digest(), 'big')
+              for shingle in shingles]
+    return [min(((a * h + b) & _MASK) % _PRIME for h in hashes)
+            for a, b in _PERMUTATIONS]
+
+
+def similarity(signature, other):
+    return sum(x == y for x, y in zip(signature, other)) / NUM_PERM
+
+
+class Cluster():
+    """Logfiles failing the same way, analyzed once through representative"""
+    def __init__(self, representative, signature):
+        self.representative = representative
+        self.signature = signature
+        self.members = [representative]
+        self.response = None
+
+
+class FailureClusters():
+    """Online clustering of logjuicer diffs.
+
+    Identical normalized diffs are found by fingerprint, near-identical
+    ones through locality sensitive hashing of their MinHash signatures.
+    """
+    def __init__(self, threshold=SIMILARITY):
+        self.threshold = threshold
+        self.fingerprints = {}
+        self.buckets = {}
+        self.clusters = []
+
+    def bands(self, signature):
+        rows = NUM_PERM // BANDS
+        return [(band, tuple(signature[band * rows:(band + 1) * rows]))
+                for band in range(BANDS)]
+
+    def add(self, logfile, diff):
+        """Assign logfile to a cluster, returns it and whether it is new"""
+        normalized = normalize(diff)
+        key = fingerprint(normalized)
+        cluster = self.fingerprints.get(key)
+        if cluster is not None:
+            cluster.members.append(logfile)
+            return cluster, False
+
+        signature = minhash(normalized)
+        candidates = {id(c): c for band in self.bands(signature)
+                      for c in self.buckets.get(band, [])}
+        best = max(candidates.values(), default=None,
+                   key=lambda c: similarity(signature, c.signature))
+        if best is not None and \
+                similarity(signature, best.signature) >= self.threshold:
+            best.members.append(logfile)
+            self.fingerprints[key] = best
+            return best, False
+
+        cluster = Cluster(logfile, signature)
+        self.clusters.append(cluster)
+        self.fingerprints[key] = cluster
+        for band in self.bands(signature):
+            self.buckets.setdefault(band, []).append(cluster)
+        return cluster, True
@@ -0,0 +1,324 @@
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 8765
+DAEMON_URL = os.environ.get("LIGHTSPEED_AGENT_DAEMON")
+# Seconds a finished job is kept for clients to fetch its result
+JOB_TTL = 3600
+MODES = ("ask", "analyze", "analyze-with-jira")
+
+
+class Job():
+    """One submitted analysis and the history of its status changes"""
+    def __init__(self, request):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.events = []
+        self.finished = None
+
+    def describe(self):
+        return {
+            "id": self.id,
+            "mode": self.request.get("mode"),
+            "logfile": self.request.get("logfile"),
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class TriageService():
+    """Job queue running analyses with warm Lightspeed and Jira connections.
+
+    Logjuicer diffs run in a process pool, Lightspeed queries in a thread
+    pool, both sized independently. Jobs move through the queued, diffing,
+    querying and done or failed states.
+    """
+    def __init__(self, url, diff_workers=None, llm_workers=None):
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        import agent
+        self.agent = agent
+        self.client = agent.OLSClient(
+            url, cache=agent.ResponseCache(),
+            max_queries=llm_workers or agent.OLS_WORKERS)
+        self.client.check_health()
+        self.store = agent.AnalysisStore()
+        self.diffs = ProcessPoolExecutor(
+            max_workers=diff_workers or os.cpu_count())
+        self.queries = ThreadPoolExecutor(
+            max_workers=llm_workers or agent.OLS_WORKERS)
+        self.jobs = {}
+        self.changed = threading.Condition()
+
+    def submit(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("the request must be a JSON object")
+        mode = request.get("mode")
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        if mode == "ask" and not request.get("query"):
+            raise ValueError("ask requires a query")
+        if mode != "ask" and not request.get("logfile"):
+            raise ValueError(f"{mode} requires a logfile")
+        if mode == "analyze-with-jira" and not request.get("project_key"):
+            raise ValueError("analyze-with-jira requires a project_key")
+        if not isinstance(request.get("juicer_options", {}), dict):
+            raise ValueError("juicer_options must be a JSON object")
+        for option in ("max_bytes", "token_budget", "concurrency"):
+            value = request.get(option, 1)
+            if not isinstance(value, int) or isinstance(value, bool) \
+                    or value < 1:
+                raise ValueError(f"{option} must be a positive integer")
+
+        job = Job(request)
+        with self.changed:
+            self.expire()
+            self.jobs[job.id] = job
+        self.update(job, "queued")
+        if mode == "ask":
+            self.queries.submit(self.query, job, request["query"], None)
+        else:
+            future = self.diffs.submit(
+                self.agent.juice_log, request["logfile"],
+                request.get("juicer_options", {}),
+                request.get("max_bytes", self.agent.MAX_DIFF_BYTES))
+            self.update(job, "diffing")
+            future.add_done_callback(lambda future: self.diffed(job, future))
+        return job
+
+    def diffed(self, job, future):
+        try:
+            analysis = future.result()
+            self.agent.merge_metrics(analysis)
+        except Exception as e:
+            self.update(job, "failed", error=str(e))
+            return
+        if analysis["diff"] is None:
+            self.update(job, "failed", error="Error during logjuicer execution")
+            return
+        self.queries.submit(self.prompt_and_query, job, analysis)
+
+    def prompt_and_query(self, job, analysis):
+        project_key = job.request.get("project_key")
+        try:
+            if job.request["mode"] == "analyze-with-jira":
+                prompt = self.agent.jira_prompt(project_key, analysis["diff"])
+            else:
+                prompt = self.agent.analysis_prompt(project_key)
+        except Exception as e:
+            self.update(job, "failed", error=str(e))
+            return
+        self.query(job, prompt, analysis)
+
+    def query(self, job, prompt, analysis):
+        self.update(job, "querying")
+        request = job.request
+        try:
+            if request["mode"] == "ask":
+                result = self.client.query(prompt)
+            else:
+                result = self.agent.query_analysis(
+                    self.client, analysis, prompt, self.store,
+                    request.get("juicer_options", {}).get("cache", True),
+                    request.get("token_budget", self.agent.TOKEN_BUDGET),
+                    request.get("concurrency", self.agent.OLS_WORKERS),
+                    mode=request["mode"])
+        except Exception as e:
+            self.update(job, "failed", error=str(e))
+            return
+        self.update(job, "done", result=result)
+
+    def update(self, job, status, result=None, error=None):
+        with self.changed:
+            job.status = status
+            job.result = result
+            job.error = error
+            if status in ("done", "failed"):
+                job.finished = time.time()
+            job.events.append(job.describe())
+            self.changed.notify_all()
+
+    def expire(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.finished and now - job.finished > JOB_TTL]:
+            del self.jobs[job_id]
+
+    def prometheus(self):
+        """Prometheus metrics of the stages and of the job queue"""
+        from metrics import METRICS, PREFIX
+
+        with self.changed:
+            statuses = [job.status for job in self.jobs.values()]
+        lines = [f"# TYPE {PREFIX}_jobs gauge"] + [
+            f'{PREFIX}_jobs{{status="{status}"}} {statuses.count(status)}'
+            for status in ("queued", "diffing", "querying", "done",
+                           "failed")]
+        return METRICS.prometheus() + "\n".join(lines) + "\n"
+
+    def events(self, job, timeout=None):
+        """Yield the status changes of job until it finishes"""
+        seen = 0
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: len(job.events) > seen,
+                                      timeout=timeout)
+                events = job.events[seen:]
+            if not events:
+                return
+            seen += len(events)
+            yield from events
+            if events[-1]["status"] in ("done", "failed"):
+                return
+
+
+class Handler(BaseHTTPRequestHandler):
+    """HTTP API of the triage service
+
+    POST /jobs               submit {"mode", "logfile" or "query", ...}
+    GET  /jobs/<id>          job status and result
+    GET  /jobs/<id>/events   status changes as JSON lines until finished
+    GET  /health             liveness
+    GET  /metrics            Prometheus metrics
+    """
+    service = None
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = self.service.submit(json.loads(self.rfile.read(length)))
+        except (ValueError, json.JSONDecodeError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.send_json(202, job.describe())
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if parts == ["metrics"]:
+            data = self.service.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type",
+                             "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if parts == ["health"]:
+            self.send_json(200, {"status": "ok",
+                                 "jobs": len(self.service.jobs)})
+            return
+        if len(parts) < 2 or parts[0] != "jobs":
+            self.send_json(404, {"error": "not found"})
+            return
+        job = self.service.jobs.get(parts[1])
+        if job is None:
+            self.send_json(404, {"error": f"unknown job {parts[1]}"})
+            return
+        if parts[2:] == ["events"]:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for event in self.service.events(job):
+                self.wfile.write(json.dumps(event).encode() + b"\n")
+                self.wfile.flush()
+            self.close_connection = True
+            return
+        self.send_json(200, job.describe())
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} - {format % args}")
+
+
+def serve(url, host=DAEMON_HOST, port=DAEMON_PORT, diff_workers=None,
+          llm_workers=None):
+    Handler.service = TriageService(url, diff_workers, llm_workers)
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Triage service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class DaemonClient():
+    """Thin client of the triage service, standard library only so that
+    submitting a job costs no heavy imports."""
+    def __init__(self, url=DAEMON_URL):
+        self.url = url.rstrip("/")
+
+    def request(self, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(
+            self.url + path, data=data,
+            headers={"Content-Type": "application/json"})
+        return urllib.request.urlopen(request)
+
+    def submit(self, **job):
+        with self.request("/jobs", job) as response:
+            return json.load(response)
+
+    def job(self, job_id):
+        with self.request(f"/jobs/{job_id}") as response:
+            return json.load(response)
+
+    def events(self, job_id):
+        with self.request(f"/jobs/{job_id}/events") as response:
+            for line in response:
+                yield json.loads(line)
+
+    def wait(self, job_id):
+        """Follow a job until it finishes, returns its final state"""
+        job = None
+        for job in self.events(job_id):
+            print(f"[{job['logfile'] or job['mode']}] {job['status']}",
+                  flush=True)
+        return job
+
+
+if __name__ == "__main__":
+    from agent import pop_option
+    from metrics import profile_to, trace_to
+
+    host = pop_option(sys.argv, "--host", DAEMON_HOST)
+    port = int(pop_option(sys.argv, "--port", DAEMON_PORT))
+    diff_workers = pop_option(sys.argv, "--diff-workers")
+    llm_workers = pop_option(sys.argv, "--llm-workers")
+    url = pop_option(sys.argv, "--ols-url", "http://0.0.0.0:8080")
+    trace = pop_option(sys.argv, "--trace")
+    profile = pop_option(sys.argv, "--profile")
+    if len(sys.argv) > 1:
+        print("Usage help:\n\
+        python daemon.py [--host <host>] [--port <port>] \
+[--diff-workers <n>] [--llm-workers <n>] [--ols-url <url>] \
+[--trace <file>] [--profile <file>]")
+        sys.exit(1)
+    if trace:
+        trace_to(trace)
+    if profile:
+        profile_to(profile)
+    serve(url, host, port, diff_workers and int(diff_workers),
+          llm_workers and int(llm_workers))
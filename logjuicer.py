@@ -1,42 +1,714 @@
+import contextlib
+import fnmatch
+import functools
+import glob
+import gzip
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import shutil
 import subprocess
 import sys
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import count, observe, span
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+JUICER = "/home/apalanis/.cargo/bin/logjuicer"
+CONFIG = 'logjuicer.yaml'
+BASELINE_DIR = 'baselines'
+REGISTRY = os.path.join(BASELINE_DIR, 'index.json')
+CACHE_DIR = os.environ.get(
+    "LOGJUICER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "logjuicer", "diffs"))
+MODEL_DIR = os.environ.get(
+    "LOGJUICER_MODEL_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "logjuicer", "models"))
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+CACHE_MAX_AGE = 7 * 24 * 3600
+
+
+def file_digest(path):
+    """sha256 of a file's content, memoized while the file is unchanged"""
+    stat = os.stat(path)
+    return _file_digest(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=256)
+def _file_digest(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    if size:
+        # Hash the mapped pages directly instead of copying them in blocks
+        with open(path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            digest.update(data)
+    return digest.hexdigest()
+
+
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.zst')
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+LINE = re.compile(rb'[^\n]*\n|[^\n]+')
+
+
+def split_member(logpath):
+    """Split archive.tar.gz:member/path.log into archive and member"""
+    archive, sep, member = logpath.partition(':')
+    if sep and archive.endswith(TAR_SUFFIXES) and os.path.isfile(archive):
+        return archive, member
+    return logpath, None
+
+
+def log_digest(logpath):
+    """Content hash of a logfile, compressed file or archive member"""
+    archive, member = split_member(logpath)
+    if member is None:
+        return file_digest(logpath)
+    return hashlib.sha256(
+        f"{file_digest(archive)}:{member}".encode()).hexdigest()
+
+
+def decompress(path):
+    """Open path for reading, decompressing .gz and .zst on the fly"""
+    if path.endswith(('.gz', '.tgz')):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise LogJuicerError(
+                f"{path}: reading .zst logs requires the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'),
+                                                          closefd=True)
+    return open(path, 'rb')
+
+
+def is_streamed(logpath):
+    """Whether logpath has to be decompressed before logjuicer reads it"""
+    archive, member = split_member(logpath)
+    return member is not None or logpath.endswith(COMPRESSED_SUFFIXES)
+
+
+@contextlib.contextmanager
+def open_log(logpath):
+    """Open a plain, compressed or archived logfile as a byte stream"""
+    archive, member = split_member(logpath)
+    if member is None and not logpath.endswith(COMPRESSED_SUFFIXES):
+        # Plain files are read through their mapped pages
+        with open(logpath, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield io.BytesIO()
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+        return
+    if member is None:
+        with decompress(logpath) as f:
+            yield f
+        return
+    # Stream through the archive instead of seeking in the decompressed data
+    with decompress(archive) as f, tarfile.open(fileobj=f, mode='r|') as tar:
+        for info in tar:
+            if info.name.lstrip('./') == member.lstrip('./'):
+                yield tar.extractfile(info)
+                return
+    raise LogJuicerError(f"{member} not found in {archive}")
+
+
+class PreFilter():
+    """Drop the lines matching the ignore_patterns of the logjuicer config
+    before logjuicer reads them.
+
+    All patterns are compiled into one alternation and the log is filtered
+    in chunks of whole lines.
+    """
+    def __init__(self, config=CONFIG, chunk_size=4 * 1024 * 1024):
+        if yaml is None:
+            raise LogJuicerError("the pre-filter requires the PyYAML package")
+        with open(config) as f:
+            entries = yaml.safe_load(f) or []
+        patterns = [pattern for entry in entries
+                    for pattern in (entry.get("config") or {})
+                    .get("ignore_patterns", [])]
+        self.pattern = re.compile("|".join(
+            f"(?:{pattern})" for pattern in patterns).encode()) \
+            if patterns else None
+        self.chunk_size = chunk_size
+        self.lines = 0
+        self.removed = 0
+
+    def filter(self, chunk):
+        # Lines end at \n only, progress output rewrites its line with \r
+        lines = LINE.findall(chunk)
+        kept = [line for line in lines if not self.pattern.search(line)]
+        self.lines += len(lines)
+        self.removed += len(lines) - len(kept)
+        return b''.join(kept)
+
+    def copy(self, source, target):
+        if self.pattern is None:
+            shutil.copyfileobj(source, target, self.chunk_size)
+            return
+        rest = b''
+        for chunk in iter(lambda: source.read(self.chunk_size), b''):
+            chunk = rest + chunk
+            end = chunk.rfind(b'\n') + 1
+            rest = chunk[end:]
+            target.write(self.filter(chunk[:end]))
+        if rest:
+            target.write(self.filter(rest))
+
+
+@contextlib.contextmanager
+def log_input(logpath, prefilter=None):
+    """Path logjuicer can read logpath from.
+
+    Plain files are used as is, compressed files and archive members are
+    decompressed by a thread into a named pipe so no decompressed copy is
+    ever written to disk. With a prefilter, the log goes through the pipe
+    without its ignored lines.
+    """
+    if not is_streamed(logpath) and prefilter is None:
+        yield logpath
+        return
+
+    name = os.path.basename(split_member(logpath)[1] or logpath)
+    for suffix in COMPRESSED_SUFFIXES:
+        name = name.removesuffix(suffix)
+    with tempfile.TemporaryDirectory(prefix='logjuicer-') as tmp:
+        fifo = os.path.join(tmp, name)
+        os.mkfifo(fifo)
+        errors = []
+
+        def feed():
+            try:
+                # Open the pipe first so the reader gets EOF on any error
+                with open(fifo, 'wb') as pipe, open_log(logpath) as source:
+                    if prefilter:
+                        prefilter.copy(source, pipe)
+                    else:
+                        shutil.copyfileobj(source, pipe, 1024 * 1024)
+            except BrokenPipeError:
+                pass
+            except Exception as e:
+                errors.append(e)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            yield fifo
+        finally:
+            if feeder.is_alive():
+                # Unblock a feeder still waiting for or writing to a reader
+                # that went away
+                fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+                os.close(fd)
+                feeder.join()
+        if errors:
+            raise LogJuicerError(f"Failed to read {logpath}: {errors[0]}")
+
+
+class DiffCache():
+    """On-disk cache of logjuicer diffs, content addressed by the hashes of
+    the baseline, the target log and the logjuicer config.
+
+    Entries are evicted once they are older than max_age seconds or, least
+    recently used first, when the cache grows beyond max_bytes. Concurrent
+    processes may evict the same entries, one that is already gone is
+    skipped.
+    """
+    def __init__(self, path=CACHE_DIR, max_bytes=CACHE_MAX_BYTES,
+                 max_age=CACHE_MAX_AGE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def key(self, *paths):
+        return hashlib.sha256(
+            ":".join(log_digest(path) for path in paths).encode()
+        ).hexdigest()
+
+    def entry(self, key):
+        return os.path.join(self.path, key[:2], key + '.diff')
+
+    def open(self, key):
+        """Open a cached diff for reading, None on a miss"""
+        entry = self.entry(key)
+        try:
+            if time.time() - os.path.getmtime(entry) > self.max_age:
+                os.remove(entry)
+                return None
+            f = open(entry)
+        except FileNotFoundError:
+            return None
+        # Refresh the mtime so eviction is least recently used first
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(entry)
+        return f
+
+    def get(self, key):
+        f = self.open(key)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def writer(self, key):
+        return CacheWriter(self, key)
+
+    def put(self, key, diff):
+        writer = self.writer(key)
+        writer.write(diff)
+        writer.commit()
+
+    def evict(self):
+        entries = []
+        now = time.time()
+        for root, _, files in os.walk(self.path):
+            # The temporary files of writers are not entries yet
+            for name in fnmatch.filter(files, '*.diff'):
+                entry = os.path.join(root, name)
+                try:
+                    stat = os.stat(entry)
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(entry)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(entry)
+            total -= size
+
+
+class CacheWriter():
+    """Incremental writer of a cache entry.
+
+    The diff is written to a temporary file and renamed into place on
+    commit, so concurrent readers never see a partial or truncated diff.
+    """
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.entry = cache.entry(key)
+        os.makedirs(os.path.dirname(self.entry), exist_ok=True)
+        fd, self.tmp = tempfile.mkstemp(dir=os.path.dirname(self.entry))
+        self.file = os.fdopen(fd, 'w')
+
+    def write(self, data):
+        self.file.write(data)
+
+    def commit(self):
+        self.file.close()
+        os.replace(self.tmp, self.entry)
+        self.cache.evict()
+
+    def discard(self):
+        if not self.file.closed:
+            self.file.close()
+            os.remove(self.tmp)
+
+
+class BaselineModels():
+    """Store of pre-built logjuicer models, one per baseline.
+
+    A model is named after the baseline, the hash of its path, so that
+    baselines of the same name in different directories do not share it,
+    and the hashes of the baseline and of the logjuicer config, so editing
+    either one invalidates it.
+    """
+    def __init__(self, path=MODEL_DIR):
+        self.path = path
+
+    def model(self, baseline, config):
+        name = os.path.splitext(os.path.basename(baseline))[0] + '-' + \
+            hashlib.sha256(os.path.abspath(baseline).encode()).hexdigest()[:8]
+        version = hashlib.sha256(
+            f"{file_digest(baseline)}:{file_digest(config)}".encode()
+        ).hexdigest()[:16]
+        return os.path.join(self.path, f"{name}-{version}.bin")
+
+    def get(self, baseline, config):
+        try:
+            model = self.model(baseline, config)
+        except OSError:
+            # A missing baseline is reported by logjuicer
+            return None
+        return model if os.path.exists(model) else None
+
+    def build(self, juicer, baseline, config):
+        try:
+            model = self.model(baseline, config)
+        except OSError as e:
+            print(f"Error during logjuicer execution: {e}")
+            return None
+        if os.path.exists(model):
+            print("Baseline model is up to date:", model)
+            return model
+        os.makedirs(self.path, exist_ok=True)
+        command = [juicer, "--config", config, "--model", model,
+                   "train", baseline]
+        print("Building baseline model with:", command)
+        process = subprocess.run(command, capture_output=True, text=True)
+        if process.returncode != 0:
+            print(f"Error during logjuicer execution: {process.stderr}")
+            return None
+        self.prune(model)
+        return model
+
+    def prune(self, model):
+        """Remove stale models built from older versions of a baseline"""
+        name = os.path.basename(model).rsplit('-', 1)[0]
+        for stale in glob.glob(os.path.join(self.path, name + '-*.bin')):
+            if stale != model and \
+                    os.path.basename(stale).rsplit('-', 1)[0] == name:
+                os.remove(stale)
+
+
+class BaselineRegistry():
+    """Index of baselines per test type, stored as baselines/index.json
+
+    {"types": {"oslat": [{"path": "baselines/oslat.log", "size": 1024,
+                          "date": "2025-06-01T10:00:00",
+                          "ocp_version": "4.18"}]},
+     "patterns": [{"pattern": "*oslat*", "logtype": "oslat"}]}
+
+    Logtypes are looked up in a dict, patterns are only tried in order when
+    the logfile name does not follow the <logtype>_<details> naming scheme.
+    Without an index, baselines/<logtype>.log is used as before.
+    """
+    def __init__(self, path=REGISTRY):
+        self.path = path
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = {}
+        self.types = index.get("types", {})
+        self.patterns = index.get("patterns", [])
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump({"types": self.types, "patterns": self.patterns}, f,
+                      indent=2, sort_keys=True)
+
+    def logtype(self, logfile):
+        name = os.path.basename(split_member(logfile)[1] or logfile)
+        logtype = name.split('_')[0]
+        if logtype in self.types:
+            return logtype
+        for entry in self.patterns:
+            if fnmatch.fnmatch(name, entry["pattern"]):
+                return entry["logtype"]
+        return logtype
+
+    def baselines(self, logtype, ocp_version=None):
+        """Baselines of a logtype, best match first.
+
+        Baselines of the requested OCP version rank first, newest first.
+        """
+        entries = self.types.get(logtype)
+        if not entries:
+            return [os.path.join(BASELINE_DIR, logtype + '.log')]
+        ranked = sorted(entries, key=lambda entry: (
+            ocp_version is not None and
+            entry.get("ocp_version") == ocp_version,
+            entry.get("date", "")), reverse=True)
+        return [entry["path"] for entry in ranked]
+
+    def paths(self):
+        if not self.types:
+            return sorted(glob.glob(os.path.join(BASELINE_DIR, '*.log')))
+        return sorted(entry["path"] for entries in self.types.values()
+                      for entry in entries)
+
+    def register(self, logtype, path, ocp_version=None, pattern=None):
+        stat = os.stat(path)
+        entries = [entry for entry in self.types.get(logtype, [])
+                   if entry["path"] != path]
+        entries.append({
+            "path": path,
+            "size": stat.st_size,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S",
+                                  time.localtime(stat.st_mtime)),
+            "ocp_version": ocp_version,
+        })
+        self.types[logtype] = entries
+        if pattern and {"pattern": pattern, "logtype": logtype} \
+                not in self.patterns:
+            self.patterns.append({"pattern": pattern, "logtype": logtype})
+
+    def index(self):
+        """Register every baselines/<logtype>.log not yet in the index"""
+        registered = set(self.paths()) if self.types else set()
+        for path in sorted(glob.glob(os.path.join(BASELINE_DIR, '*.log'))):
+            if path not in registered:
+                logtype = os.path.splitext(os.path.basename(path))[0]
+                self.register(logtype, path)
+
+
+class LogJuicerError(Exception):
+    """logjuicer exited with an error"""
+
+
+def anomaly_blocks(lines):
+    """Group diff lines into the blank line separated anomaly blocks.
+
+    Blocks keep their newlines, joining them gives back the diff.
+    """
+    block = []
+    for line in lines:
+        block.append(line)
+        if not line.strip() and len(block) > 1 and block[-2].strip():
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+def merge_diffs(diffs):
+    """Merge diffs against several baselines, keeping each block once"""
+    seen = set()
+    blocks = []
+    for diff in diffs:
+        for block in diff.split('\n\n'):
+            block = block.strip('\n')
+            if block and block not in seen:
+                seen.add(block)
+                blocks.append(block)
+    return '\n\n'.join(blocks) + '\n'
 
 
 class LogJuicer():
     """Python client for Logjuicer
     https://github.com/logjuicer/logjuicer
     """
-    def __init__(self, logpath):
+    def __init__(self, logpath, cache=True, ocp_version=None,
+                 all_baselines=False, prefilter=False):
+        registry = BaselineRegistry()
         self.logfile = logpath
-        self.baseline = self.baseline()
-        self.juicer = "/home/apalanis/.cargo/bin/logjuicer"
-        self.config = 'logjuicer.yaml'
-        self.logtype = self.logtype()
+        self.logtype = registry.logtype(logpath)
+        self.baselines = registry.baselines(self.logtype, ocp_version)
+        if not all_baselines:
+            self.baselines = self.baselines[:1]
+        self.baseline = self.baselines[0]
+        self.juicer = JUICER
+        self.config = CONFIG
+        self.cache = DiffCache() if cache else None
+        self.models = BaselineModels()
+        self.prefilter = prefilter
 
-    def baseline(self):
-        return 'baselines/' + str.split(self.logfile, '_')[0] + '.log'
+    def juice(self):
+        with span("juice", logfile=self.logfile, logtype=self.logtype,
+                  baselines=len(self.baselines)) as attrs:
+            if len(self.baselines) == 1:
+                diff = self.diff(self.baseline)
+            else:
+                with ThreadPoolExecutor(
+                        max_workers=len(self.baselines)) as pool:
+                    diffs = [diff for diff in
+                             pool.map(self.diff, self.baselines)
+                             if diff is not None]
+                diff = merge_diffs(diffs) if diffs else None
+            attrs["bytes"] = len(diff) if diff is not None else None
+            return diff
 
-    def logtype(self):
-        return str.split(self.logfile, '_')[0]
+    def juice_stream(self):
+        """Yield anomaly blocks as logjuicer produces them.
 
-    def juice(self):
+        Raises LogJuicerError when logjuicer fails. Closing the generator
+        early stops the logjuicer process, or with caching enabled waits
+        for it to finish the diff into the cache.
+        """
+        if len(self.baselines) == 1:
+            yield from self.stream(self.baseline)
+            return
+        diff = self.juice()
+        if diff is None:
+            raise LogJuicerError("no baseline could be diffed")
+        yield from anomaly_blocks(diff.splitlines(keepends=True))
 
-        command = [self.juicer, "--config", self.config, "diff",
-                   self.baseline, self.logfile]
-        print("Juicing logfile with:", command)
-        process = subprocess.run(command, capture_output=True, text=True)
-        if process.returncode != 0:
-            print(f"Error during logjuicer execution: {process.stderr}")
+    def diff(self, baseline):
+        try:
+            return ''.join(self.stream(baseline))
+        except LogJuicerError as e:
+            print(f"Error during logjuicer execution: {e}")
             return None
-        diff = process.stdout
-        return diff
+
+    def command(self, baseline, target, model=None):
+        command = [self.juicer, "--config", self.config]
+        if model:
+            command += ["--model", model]
+        return command + ["diff", baseline, target]
+
+    def stream(self, baseline):
+        key = None
+        if self.cache:
+            try:
+                key = self.cache.key(baseline, self.logfile, self.config)
+            except OSError:
+                # Missing inputs are a miss, logjuicer reports them
+                count("diff_cache", result="miss")
+        if key:
+            if self.prefilter:
+                # Filtered logs shift the line numbers logjuicer reports
+                key = hashlib.sha256(f"{key}:prefilter".encode()).hexdigest()
+            cached = self.cache.open(key)
+            count("diff_cache", result="miss" if cached is None else "hit")
+            if cached is not None:
+                print("Using cached diff for", self.logfile)
+                with cached:
+                    yield from anomaly_blocks(cached)
+                return
+
+        model = self.models.get(baseline, self.config)
+        prefilter = PreFilter(self.config) if self.prefilter else None
+        writer = self.cache.writer(key) if key else None
+        inputs = contextlib.ExitStack()
+        try:
+            with span("logjuicer", logfile=self.logfile, baseline=baseline,
+                      model=model is not None) as attrs, inputs:
+                base = inputs.enter_context(log_input(baseline))
+                target = inputs.enter_context(
+                    log_input(self.logfile, prefilter))
+                command = self.command(base, target, model)
+                print("Juicing logfile with:", command)
+                attrs["bytes"] = 0
+                # Closing this generator early stops logjuicer, unless the
+                # diff is cached: then a thread finishes it for the cache
+                # while the caller goes on with the part it read
+                blocks = inputs.enter_context(
+                    contextlib.closing(self.run(command, writer)))
+                for block in blocks:
+                    attrs["bytes"] += len(block)
+                    try:
+                        yield block
+                    except GeneratorExit:
+                        if not writer:
+                            raise
+                        threading.Thread(
+                            target=self.finish, name="logjuicer-finish",
+                            args=(blocks, inputs.pop_all(), attrs["bytes"],
+                                  prefilter, writer)).start()
+                        writer = None
+                        return
+            self.finished(attrs["bytes"], prefilter, writer)
+        finally:
+            if writer:
+                writer.discard()
+
+    def finish(self, blocks, inputs, size, prefilter, writer):
+        """Read the rest of a diff its reader stopped early into the cache"""
+        try:
+            with span("logjuicer_finish", logfile=self.logfile), inputs:
+                for block in blocks:
+                    size += len(block)
+            self.finished(size, prefilter, writer, echo=False)
+        except Exception as e:
+            print(f"Not caching the diff of {self.logfile}: {e}")
+        finally:
+            writer.discard()
+
+    def finished(self, size, prefilter, writer, echo=True):
+        observe("logjuicer_output_bytes", size)
+        if prefilter:
+            if echo:
+                print(f"Pre-filter removed {prefilter.removed} of "
+                      f"{prefilter.lines} lines from {self.logfile}")
+            count("prefilter_lines", prefilter.lines)
+            count("prefilter_removed_lines", prefilter.removed)
+        # Only cache once the inputs were read without error
+        if writer:
+            writer.commit()
+
+    def run(self, command, writer=None):
+        # stderr goes to a file so a chatty logjuicer can not block the pipe
+        with tempfile.TemporaryFile(mode='w+') as stderr:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                       stderr=stderr, text=True)
+            try:
+                for block in anomaly_blocks(process.stdout):
+                    if writer:
+                        writer.write(block)
+                    yield block
+                if process.wait() != 0:
+                    stderr.seek(0)
+                    raise LogJuicerError(stderr.read())
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+
+
+def build_baselines(baselines=None):
+    """Pre-build the models of the given baselines, all by default"""
+    models = BaselineModels()
+    built = []
+    for baseline in baselines or BaselineRegistry().paths():
+        model = models.build(JUICER, baseline, CONFIG)
+        if model:
+            built.append(model)
+    return built
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
+    cache = "--no-cache" not in sys.argv
+    prefilter = "--prefilter" in sys.argv
+    args = [arg for arg in sys.argv[1:]
+            if arg not in ("--no-cache", "--prefilter")]
+    if len(args) < 1:
         print("Usage help:\n\
-        python logjuicer.py <logfile>")
+        python logjuicer.py [--no-cache] [--prefilter] <logfile>\n\
+        python logjuicer.py build-baselines [baseline ...]\n\
+        python logjuicer.py index-baselines\n\
+        python logjuicer.py register-baseline <logtype> <baseline> \
+[ocp_version] [pattern]")
+        sys.exit(1)
+    if args[0] == 'build-baselines':
+        built = build_baselines(args[1:])
+        print(f"Built {len(built)} baseline models")
+        sys.exit(0)
+    if args[0] == 'index-baselines':
+        registry = BaselineRegistry()
+        registry.index()
+        registry.save()
+        print(f"Indexed {len(registry.paths())} baselines in {registry.path}")
+        sys.exit(0)
+    if args[0] == 'register-baseline':
+        if len(args) < 3:
+            print("Usage: python logjuicer.py register-baseline <logtype> "
+                  "<baseline> [ocp_version] [pattern]")
+            sys.exit(1)
+        registry = BaselineRegistry()
+        registry.register(*args[1:5])
+        registry.save()
+        print(f"Registered {args[2]} for logtype {args[1]}")
+        sys.exit(0)
+    logpath = args[0]
+    logjuicer = LogJuicer(logpath, cache=cache, prefilter=prefilter)
+    try:
+        for block in logjuicer.juice_stream():
+            print(block, end='')
+    except LogJuicerError as e:
+        print(f"Error during logjuicer execution: {e}")
         sys.exit(1)
-    logpath = sys.argv[1]
-    logjuicer = LogJuicer(logpath)
-    print(logjuicer.juice())
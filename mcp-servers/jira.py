@@ -1,52 +1,325 @@
 """Jira integration tools."""
 
+import asyncio
+import contextlib
+import email.utils
+import io
 import logging
 import os
 import json
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from typing import List, Optional
 
 from mcp.server.fastmcp import FastMCP
-import requests
+import httpx
+
+from jira_mirror import MIRROR_DB, JiraMirror
+
+# Stage timings are shared with the agent when run from its checkout
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from metrics import count, span
+except ImportError:
+    @contextlib.contextmanager
+    def span(name, **attrs):
+        yield attrs
+
+    def count(name, value=1, **labels):
+        pass
 
 logger = logging.getLogger(__name__)
+# httpx logs every request at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 mcp = FastMCP("jira_tools")
 
+ALLOWED_PROJECTS = ["OCPBUGS", "CNF"]
+# Concurrent searches of search_jira_issues_multi
+SEARCH_WORKERS = 4
+# Rate limits (429) and server errors are retried after their Retry-After
+# header, capped at MAX_RETRY_AFTER seconds, others with exponential backoff
+RETRIES = 5
+BACKOFF_FACTOR = 1
+MAX_RETRY_AFTER = 60
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+TIMEOUT = 30
+# Jira gets a single attempt of FALLBACK_TIMEOUT seconds when a stale mirror
+# can answer instead
+FALLBACK_TIMEOUT = 5
+# Seconds issues and search results are cached, the project list is cached
+# for PROJECTS_TTL, least recently used entries go beyond CACHE_MAX_ENTRIES
+CACHE_TTL = int(os.environ.get("JIRA_CACHE_TTL", 300))
+PROJECTS_TTL = 3600
+CACHE_MAX_ENTRIES = 4096
+# Issues per search request, the next page is requested while the previous
+# one is processed
+PAGE_SIZE = 50
+# Fields searches return, the key always comes along
+SEARCH_FIELDS = ["summary", "description", "status", "assignee", "reporter",
+                 "created", "updated"]
+# Search results keep the first DESCRIPTION_PREVIEW characters of
+# descriptions longer than DESCRIPTION_CHARS
+DESCRIPTION_CHARS = 500
+DESCRIPTION_PREVIEW = 200
+
+
+class JiraCache:
+    """TTL and LRU cache of issues, search results and the project list.
+
+    The newest `updated` timestamp seen of every issue is kept, cached
+    issues and searches are dropped as soon as one of their issues was seen
+    with a newer one, so they never return outdated issues. Searches hold
+    truncated descriptions and are cached apart from the full issues of
+    get_issue. Shared by every event loop and thread of the process.
+    """
+
+    def __init__(self, ttl: int = CACHE_TTL,
+                 max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value, ttl: Optional[int] = None):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, key: tuple):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def seen(self, issue: dict) -> bool:
+        """Keep the `updated` timestamp of issue, returns whether it is the
+        newest seen"""
+        updated = issue["updated"] or ""
+        newest = self.get(("updated", issue["key"]))
+        if newest is not None and newest > updated:
+            return False
+        self.put(("updated", issue["key"]), updated)
+        return True
+
+    def stale(self, issue: dict) -> bool:
+        newest = self.get(("updated", issue["key"]))
+        return newest is not None and newest > (issue["updated"] or "")
+
+    def issue(self, issue_key: str) -> Optional[dict]:
+        issue = self.get(("issue", issue_key))
+        if issue is not None and self.stale(issue):
+            self.discard(("issue", issue_key))
+            return None
+        return issue
+
+    def put_issue(self, issue: dict):
+        if self.seen(issue):
+            self.put(("issue", issue["key"]), issue)
+
+    def search(self, key: tuple) -> Optional[List[dict]]:
+        issues = self.get(("search",) + key)
+        if issues is not None and any(map(self.stale, issues)):
+            self.discard(("search",) + key)
+            return None
+        return issues
+
+    def put_search(self, key: tuple, issues: List[dict]):
+        for issue in issues:
+            self.seen(issue)
+        self.put(("search",) + key, issues)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_cache = JiraCache()
+# One client per event loop, httpx connections can not be shared across them
+_clients = weakref.WeakKeyDictionary()
+# Event loop of run(), started on first use
+_loop = None
+_loop_lock = threading.Lock()
+_mirror: Optional[JiraMirror] = None
+
+
+def truncate(description: Optional[str]) -> Optional[str]:
+    """Preview of descriptions longer than DESCRIPTION_CHARS"""
+    if description and len(description) > DESCRIPTION_CHARS:
+        return description[:DESCRIPTION_PREVIEW] + "..."
+    return description
+
+
+def parse_issue(issue: dict, truncated: bool = False) -> dict:
+    """Flatten a Jira REST issue into the fields the tools report."""
+    fields = issue.get("fields") or {}
+    description = fields.get("description", "")
+    return {
+        "key": issue.get("key"),
+        "summary": fields.get("summary", ""),
+        "description": truncate(description) if truncated else description,
+        "status": (fields.get("status") or {}).get("name", ""),
+        "assignee": (fields.get("assignee") or {}).get("displayName", ""),
+        "reporter": (fields.get("reporter") or {}).get("displayName", ""),
+        "created": fields.get("created", ""),
+        "updated": fields.get("updated", "")
+    }
+
+
+def parse_issues(data: dict, truncated: bool = False) -> List[dict]:
+    """Issues of a search response."""
+    issues = []
+    
+    # Safely get issues list
+    issues_list = data.get("issues", [])
+    if not isinstance(issues_list, list):
+        logger.error(f"Expected list of issues, got: {type(issues_list)}")
+        return []
+    
+    for issue in issues_list:
+        if not isinstance(issue, dict):
+            logger.warning(f"Skipping non-dict issue: {type(issue)}")
+            continue
+            
+        fields = issue.get("fields", {})
+        if not isinstance(fields, dict):
+            logger.warning(f"Skipping issue with non-dict fields: {type(fields)}")
+            continue
+            
+        issues.append(parse_issue(issue, truncated))
+    
+    return issues
+
+
+def text_jql(project_key: str, search_text: str) -> str:
+    """JQL of the issues of a project matching text by title or
+    description, most recently updated first."""
+    return (f'project = "{project_key}" AND '
+            f'(summary ~ "{search_text}" OR description ~ "{search_text}") '
+            'ORDER BY updated DESC')
+
+
+def retry_delay(response: Optional[httpx.Response], attempt: int) -> float:
+    """Seconds to wait before retrying, from the Retry-After header of
+    response when there is one."""
+    retry_after = response.headers.get("Retry-After") if response else None
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = email.utils.parsedate_to_datetime(
+                    retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0), MAX_RETRY_AFTER)
+    return BACKOFF_FACTOR * 2 ** attempt
+
 
 class JiraClient:
-    """Jira API client for searching issues."""
+    """Async Jira API client for searching issues."""
     
-    def __init__(self, base_url: str, token: str):
+    def __init__(self, base_url: str, token: str,
+                 http: Optional[httpx.AsyncClient] = None):
         self.base_url = base_url.rstrip('/')
         self.token = token
+        self.http = http or httpx.AsyncClient(
+            timeout=TIMEOUT,
+            limits=httpx.Limits(max_connections=SEARCH_WORKERS * 2,
+                                max_keepalive_connections=SEARCH_WORKERS * 2))
         self.headers = {
             "Authorization": f"Bearer {token}",
             "Accept": "application/json",
             "Content-Type": "application/json"
         }
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def request(self, method: str, path: str, retries: int = RETRIES,
+                      timeout: Optional[float] = None,
+                      **kwargs) -> httpx.Response:
+        """Send a request, retrying rate limits and server errors up to
+        retries times."""
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        for attempt in range(retries + 1):
+            response = None
+            try:
+                response = await self.http.request(
+                    method, f"{self.base_url}{path}", headers=self.headers,
+                    **kwargs)
+            except httpx.TransportError as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"Jira request failed ({e}), retrying")
+            else:
+                if response.status_code not in RETRY_STATUSES or \
+                        attempt == retries:
+                    response.raise_for_status()
+                    return response
+            count("jira_retries")
+            await asyncio.sleep(retry_delay(response, attempt))
     
-    def search_issues(self, project_key: str, search_text: str, 
-                     max_results: int = 10) -> List[dict]:
+    async def search_issues(self, project_key: str, search_text: str,
+                            max_results: int = 10,
+                            fields: List[str] = SEARCH_FIELDS) -> List[dict]:
         """Search for issues in a project by title or description."""
-        jql = (f'project = "{project_key}" AND '
-               f'(summary ~ "{search_text}" OR description ~ "{search_text}") '
-               'ORDER BY updated DESC')
-        
+        issues = []
+        async with contextlib.aclosing(self.search_pages(
+                text_jql(project_key, search_text), max_results,
+                fields=fields)) as pages:
+            async for page in pages:
+                issues += page
+        return issues
+    
+    async def search_page(self, jql: str, max_results: int = 10,
+                          start_at: int = 0,
+                          fields: List[str] = SEARCH_FIELDS,
+                          next_page_token: Optional[str] = None,
+                          retries: int = RETRIES,
+                          timeout: Optional[float] = None) -> dict:
+        """One page of search results, at next_page_token when given or
+        at start_at."""
         payload = {
             "jql": jql,
             "maxResults": max_results,
-            "fields": ["summary", "description", "status", "assignee", 
-                      "reporter", "created", "updated", "key"]
+            "fields": fields
         }
+        if next_page_token:
+            payload["nextPageToken"] = next_page_token
+        else:
+            payload["startAt"] = start_at
         
         try:
-            response = requests.post(
-                f"{self.base_url}/rest/api/2/search",
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
-            response.raise_for_status()
+            with span("jira_search", start_at=start_at,
+                      max_results=max_results) as attrs:
+                response = await self.request(
+                    "POST", "/rest/api/2/search", retries, timeout,
+                    json=payload)
+                attrs["bytes"] = len(response.content)
             
             # Debug: log the response content
             logger.debug(f"Jira API response status: {response.status_code}")
@@ -62,88 +335,292 @@ class JiraClient:
             # Check if data is None or empty
             if not data:
                 logger.error("Empty response from Jira API")
-                return []
-            
-            issues = []
+                return {}
             
-            # Safely get issues list
-            issues_list = data.get("issues", [])
-            if not isinstance(issues_list, list):
-                logger.error(f"Expected list of issues, got: {type(issues_list)}")
-                return []
+            return data
             
-            for issue in issues_list:
-                if not isinstance(issue, dict):
-                    logger.warning(f"Skipping non-dict issue: {type(issue)}")
-                    continue
-                    
-                fields = issue.get("fields", {})
-                if not isinstance(fields, dict):
-                    logger.warning(f"Skipping issue with non-dict fields: {type(fields)}")
-                    continue
-                    
-                issues.append({
-                    "key": issue.get("key"),
-                    "summary": fields.get("summary", ""),
-                    "description": fields.get("description", ""),
-                    "status": (fields.get("status") or {}).get("name", ""),
-                    "assignee": (fields.get("assignee") or {}).get("displayName", ""),
-                    "reporter": (fields.get("reporter") or {}).get("displayName", ""),
-                    "created": fields.get("created", ""),
-                    "updated": fields.get("updated", "")
-                })
-            
-            return issues
-            
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error searching Jira issues: {e}")
-            if hasattr(e, 'response') and e.response is not None:
+            if isinstance(e, httpx.HTTPStatusError):
                 logger.error(f"Response status: {e.response.status_code}")
                 logger.error(f"Response content: {e.response.text}")
             raise Exception(f"Failed to search Jira issues: {str(e)}")
     
-    def get_issue(self, issue_key: str) -> Optional[dict]:
+    async def search_pages(self, jql: str, max_results: Optional[int] = None,
+                           page_size: int = PAGE_SIZE,
+                           fields: List[str] = SEARCH_FIELDS,
+                           truncated: bool = True, retries: int = RETRIES,
+                           timeout: Optional[float] = None):
+        """Yield the issues matching a JQL query page by page, up to
+        max_results.
+
+        Pages follow the nextPageToken of the response when there is one,
+        startAt otherwise. Each page is requested before the previous one
+        is yielded, descriptions are truncated unless truncated is False.
+        """
+        start_at = 0
+        remaining = max_results
+        size = page_size if remaining is None else min(page_size, remaining)
+        request = asyncio.ensure_future(self.search_page(
+            jql, size, start_at, fields, None, retries, timeout))
+        try:
+            while request:
+                data = await request
+                request = None
+                issues = parse_issues(data, truncated)
+                start_at += len(data.get("issues") or [])
+                if remaining is not None:
+                    issues = issues[:remaining]
+                    remaining -= len(issues)
+                token = data.get("nextPageToken")
+                if "isLast" in data or token:
+                    more = not data.get("isLast") and bool(token)
+                elif "total" in data:
+                    more = start_at < data["total"]
+                else:
+                    more = len(data.get("issues") or []) == size
+                if more and remaining != 0 and data.get("issues"):
+                    size = page_size if remaining is None \
+                        else min(page_size, remaining)
+                    request = asyncio.ensure_future(self.search_page(
+                        jql, size, start_at, fields, token, retries, timeout))
+                if issues:
+                    yield issues
+        finally:
+            if request:
+                request.cancel()
+    
+    async def search_jql(self, jql: str, max_results: int = 10,
+                         start_at: int = 0, fields: List[str] = SEARCH_FIELDS,
+                         truncated: bool = False) -> List[dict]:
+        """Search for issues matching a JQL query, one page at start_at."""
+        return parse_issues(
+            await self.search_page(jql, max_results, start_at, fields),
+            truncated)
+    
+    async def get_issue(self, issue_key: str, retries: int = RETRIES,
+                        timeout: Optional[float] = None) -> Optional[dict]:
         """Get a specific issue by key."""
         try:
-            response = requests.get(
-                f"{self.base_url}/rest/api/2/issue/{issue_key}",
-                headers=self.headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            fields = data.get("fields", {})
+            with span("jira_get_issue", issue_key=issue_key):
+                response = await self.request(
+                    "GET", f"/rest/api/2/issue/{issue_key}", retries,
+                    timeout)
             
-            return {
-                "key": data.get("key"),
-                "summary": fields.get("summary", ""),
-                "description": fields.get("description", ""),
-                "status": (fields.get("status") or {}).get("name", ""),
-                "assignee": (fields.get("assignee") or {}).get("displayName", ""),
-                "reporter": (fields.get("reporter") or {}).get("displayName", ""),
-                "created": fields.get("created", ""),
-                "updated": fields.get("updated", "")
-            }
+            return parse_issue(response.json())
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error getting Jira issue {issue_key}: {e}")
             return None
 
+    async def get_projects(self, project_keys: List[str]) -> List[dict]:
+        """Get the projects of project_keys concurrently, instead of
+        listing every project of the instance."""
+        async def get_project(project_key):
+            try:
+                response = await self.request(
+                    "GET", f"/rest/api/2/project/{project_key}")
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404:
+                    return None
+                raise
+            project = response.json()
+            return {"key": project.get("key"), "name": project.get("name"),
+                    "id": project.get("id")}
+
+        with span("jira_list_projects", projects=len(project_keys)):
+            projects = await asyncio.gather(*map(get_project, project_keys))
+        return [project for project in projects if project]
+
 
 def get_jira_client() -> JiraClient:
-    """Get Jira client from environment variables."""
+    """Get the Jira client of the running event loop, configured from
+    environment variables."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
     base_url = os.environ.get("JIRA_BASE_URL")
     token = os.environ.get("JIRA_TOKEN")
 
-    logger.debug(f"JIRA_BASE_URL: {base_url}")
-    logger.debug(f"JIRA_TOKEN: {token[:10] if token else 'None'}...")
+    if client is None or client.token != token or \
+            client.base_url != (base_url or "").rstrip('/'):
+        logger.debug(f"JIRA_BASE_URL: {base_url}")
+        logger.debug(f"JIRA_TOKEN: {token[:10] if token else 'None'}...")
+        if client is not None:
+            loop.create_task(client.aclose())
+        client = _clients[loop] = JiraClient(base_url, token)
     
-    return JiraClient(base_url, token)
+    return client
+
+
+async def close_jira_client():
+    """Close the Jira client of the running event loop."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """The event loop synchronous callers share, run by a daemon thread so
+    its Jira client keeps its connections from one call to the next."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="jira-loop",
+                             daemon=True).start()
+    return _loop
+
+
+def run(coroutine):
+    """Run coroutine from synchronous code, like the agent, the triage
+    daemon or the mirror sync, on the shared event loop and wait for it."""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop()).result()
+
+
+def get_jira_mirror() -> Optional[JiraMirror]:
+    """Get the local issue mirror, None until jira_mirror.py sync ran."""
+    global _mirror
+    if _mirror is None and os.path.exists(MIRROR_DB):
+        _mirror = JiraMirror()
+    return _mirror
+
+
+async def search_pages(project_key: str, search_text: str,
+                       max_results: int = 10):
+    """Yield the issues of a search page by page, from the mirror while it
+    is fresh, the cache or Jira as pages arrive otherwise.
+    
+    A stale mirror still answers when Jira can not be reached, Jira then
+    gets a single short attempt.
+    """
+    mirror = get_jira_mirror()
+    if mirror and mirror.is_fresh(project_key):
+        count("jira_mirror", result="hit")
+        yield mirror.search(project_key, search_text, max_results)
+        return
+    count("jira_mirror", result="miss")
+    key = (project_key, search_text, max_results)
+    issues = _cache.search(key)
+    count("jira_cache", result="miss" if issues is None else "hit")
+    if issues is not None:
+        yield issues
+        return
+    fallback = mirror is not None and mirror.age(project_key) is not None
+    retries, timeout = (0, FALLBACK_TIMEOUT) if fallback else (RETRIES, None)
+    issues = []
+    try:
+        async with contextlib.aclosing(get_jira_client().search_pages(
+                text_jql(project_key, search_text), max_results,
+                retries=retries, timeout=timeout)) as pages:
+            async for page in pages:
+                issues += page
+                yield page
+    except Exception as e:
+        if issues or not fallback:
+            raise
+        logger.warning(f"Jira search failed ({e}), using mirror synced "
+                       f"{mirror.age(project_key):.0f}s ago")
+        count("jira_mirror_fallbacks")
+        yield mirror.search(project_key, search_text, max_results)
+        return
+    _cache.put_search(key, issues)
+
+
+async def search_issues(project_key: str, search_text: str,
+                        max_results: int = 10) -> List[dict]:
+    """All the issues of search_pages."""
+    issues = []
+    async with contextlib.aclosing(
+            search_pages(project_key, search_text, max_results)) as pages:
+        async for page in pages:
+            issues += page
+    return issues
+
+
+async def search_many(searches: List[tuple], max_results: int = 10,
+                      concurrency: int = SEARCH_WORKERS,
+                      return_exceptions: bool = False) -> List[List[dict]]:
+    """Results of the (project_key, search_text) searches, run
+    concurrency at a time. With return_exceptions set, a failed search
+    gives its exception instead of failing them all."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def search(project_key, search_text):
+        async with semaphore:
+            return await search_issues(project_key, search_text, max_results)
+
+    return await asyncio.gather(*(search(*search_args)
+                                  for search_args in searches),
+                                return_exceptions=return_exceptions)
+
+
+async def get_issue(issue_key: str) -> Optional[dict]:
+    """Get an issue from the mirror while it is fresh, the cache or Jira
+    otherwise."""
+    mirror = get_jira_mirror()
+    project_key = issue_key.split("-")[0]
+    if mirror and mirror.is_fresh(project_key):
+        issue = mirror.get(issue_key)
+        if issue:
+            count("jira_mirror", result="hit")
+            return issue
+    count("jira_mirror", result="miss")
+    issue = _cache.issue(issue_key)
+    count("jira_cache", result="miss" if issue is None else "hit")
+    if issue is not None:
+        return issue
+    if mirror and mirror.age(project_key) is not None:
+        issue = await get_jira_client().get_issue(issue_key, 0,
+                                                  FALLBACK_TIMEOUT)
+    else:
+        issue = await get_jira_client().get_issue(issue_key)
+    if issue is not None:
+        _cache.put_issue(issue)
+    elif mirror:
+        issue = mirror.get(issue_key)
+    return issue
+
+
+async def get_projects() -> List[dict]:
+    """Get the allowed projects, cached for PROJECTS_TTL seconds."""
+    projects = _cache.get(("projects",))
+    count("jira_cache", result="miss" if projects is None else "hit")
+    if projects is None:
+        projects = await get_jira_client().get_projects(ALLOWED_PROJECTS)
+        _cache.put(("projects",), projects, PROJECTS_TTL)
+    return projects
+
+
+def write_issues(buffer: io.StringIO, issues: List[dict],
+                 numbered: int = 0) -> int:
+    """Write issues to buffer as a readable list numbered after numbered,
+    returns the number of the last one."""
+    for i, issue in enumerate(issues, numbered + 1):
+        buffer.write(f"{i}. **{issue['key']}** - {issue['summary']}\n"
+                     f"   - Status: {issue['status']}\n"
+                     f"   - Assignee: {issue['assignee']}\n"
+                     f"   - Reporter: {issue['reporter']}\n"
+                     f"   - Created: {issue['created']}\n"
+                     f"   - Updated: {issue['updated']}\n")
+        
+        # Add description if available (truncated for readability)
+        if issue['description']:
+            buffer.write(f" {truncate(issue['description'])}\n")
+        
+        buffer.write("\n")
+        numbered = i
+    return numbered
+
+
+def format_issues(issues: List[dict]) -> str:
+    """Format issues as a readable numbered list."""
+    buffer = io.StringIO()
+    write_issues(buffer, issues)
+    return f"Found {len(issues)} matching issues:\n\n" + buffer.getvalue()
 
 
 @mcp.tool()
-def search_jira_issues(project_key: str, search_text: str, max_results: int = 10) -> str:
+async def search_jira_issues(project_key: str, search_text: str, max_results: int = 10) -> str:
     """Search for Jira issues in a project by title or description.
     
     Args:
@@ -155,47 +632,87 @@ def search_jira_issues(project_key: str, search_text: str, max_results: int = 10
         JSON string containing matching issues with their details
     """
     # Validate project key
-    allowed_projects = ["OCPBUGS", "CNF"]
-    if project_key not in allowed_projects:
-        return f"Error: Only projects {allowed_projects} are allowed. Got: {project_key}"
+    if project_key not in ALLOWED_PROJECTS:
+        return f"Error: Only projects {ALLOWED_PROJECTS} are allowed. Got: {project_key}"
     
     try:
         logger.debug(f"search_jira_issues called with project_key={project_key}, search_text={search_text}, max_results={max_results}")
-        client = get_jira_client()
-        logger.debug(f"Got Jira client: {client}")
-        issues = client.search_issues(project_key, search_text, max_results)
-        logger.debug(f"Got issues: {issues}")
+        # Pages are formatted as they arrive
+        buffer = io.StringIO()
+        found = 0
+        async with contextlib.aclosing(search_pages(
+                project_key, search_text, max_results)) as pages:
+            async for page in pages:
+                found = write_issues(buffer, page, found)
+        logger.debug(f"Got {found} issues")
         
-        if not issues:
+        if not found:
             return "No matching issues found."
         
-        # Format the results as a readable list
-        formatted_result = f"Found {len(issues)} matching issues:\n\n"
+        return f"Found {found} matching issues:\n\n" + buffer.getvalue()
         
-        for i, issue in enumerate(issues, 1):
-            formatted_result += f"{i}. **{issue['key']}** - {issue['summary']}\n"
-            formatted_result += f"   - Status: {issue['status']}\n"
-            formatted_result += f"   - Assignee: {issue['assignee']}\n"
-            formatted_result += f"   - Reporter: {issue['reporter']}\n"
-            formatted_result += f"   - Created: {issue['created']}\n"
-            formatted_result += f"   - Updated: {issue['updated']}\n"
-            
-            # Add description if available (truncated for readability)
-            if issue['description']:
-                desc = issue['description'][:200] + "..." if len(issue['description']) > 500 else issue['description']
-                formatted_result += f" {desc}\n"
-            
-            formatted_result += "\n"
+    except Exception as e:
+        logger.error(f"Error in search_jira_issues: {e}")
+        return f"Error searching Jira issues: {str(e)}"
+
+
+@mcp.tool()
+async def search_jira_issues_multi(search_texts: List[str],
+                             project_keys: Optional[List[str]] = None,
+                             max_results: int = 10) -> str:
+    """Run several Jira searches concurrently and merge the results.
+    
+    Args:
+        search_texts: Texts to search for in issue summary or description
+        project_keys: Jira projects to search in (default: OCPBUGS and CNF)
+        max_results: Maximum number of results per search (default: 10)
+    
+    Returns:
+        Deduplicated matching issues of all searches, most recently updated
+        first
+    """
+    project_keys = project_keys or ALLOWED_PROJECTS
+    invalid = [key for key in project_keys if key not in ALLOWED_PROJECTS]
+    if invalid:
+        return f"Error: Only projects {ALLOWED_PROJECTS} are allowed. Got: {invalid}"
+    
+    try:
+        searches = [(project_key, search_text)
+                    for project_key in project_keys
+                    for search_text in search_texts]
+        results = await search_many(searches, max_results,
+                                    return_exceptions=True)
+        
+        issues = {}
+        failed = []
+        for (project_key, search_text), result in zip(searches, results):
+            if isinstance(result, Exception):
+                logger.error(f"Search of {search_text!r} in {project_key} "
+                             f"failed: {result}")
+                failed.append(result)
+                continue
+            for issue in result:
+                issues.setdefault(issue["key"], issue)
+        if failed and len(failed) == len(searches):
+            raise failed[0]
+        if not issues:
+            return "No matching issues found."
         
+        formatted_result = format_issues(sorted(
+            issues.values(), key=lambda issue: issue["updated"],
+            reverse=True))
+        if failed:
+            formatted_result += (f"{len(failed)} of {len(searches)} "
+                                 f"searches failed: {failed[0]}\n")
         return formatted_result
         
     except Exception as e:
-        logger.error(f"Error in search_jira_issues: {e}")
+        logger.error(f"Error in search_jira_issues_multi: {e}")
         return f"Error searching Jira issues: {str(e)}"
 
 
 @mcp.tool()
-def get_jira_issue(issue_key: str) -> str:
+async def get_jira_issue(issue_key: str) -> str:
     """Get a specific Jira issue by its key.
     
     Args:
@@ -205,24 +722,24 @@ def get_jira_issue(issue_key: str) -> str:
         JSON string containing the issue details
     """
     try:
-        client = get_jira_client()
-        issue = client.get_issue(issue_key)
+        issue = await get_issue(issue_key)
         
         if not issue:
             return f"Issue {issue_key} not found or access denied."
         
         # Format the issue as a readable string
-        formatted_result = f"**{issue['key']}** - {issue['summary']}\n\n"
-        formatted_result += f"**Status:** {issue['status']}\n"
-        formatted_result += f"**Assignee:** {issue['assignee']}\n"
-        formatted_result += f"**Reporter:** {issue['reporter']}\n"
-        formatted_result += f"**Created:** {issue['created']}\n"
-        formatted_result += f"**Updated:** {issue['updated']}\n\n"
+        buffer = io.StringIO()
+        buffer.write(f"**{issue['key']}** - {issue['summary']}\n\n"
+                     f"**Status:** {issue['status']}\n"
+                     f"**Assignee:** {issue['assignee']}\n"
+                     f"**Reporter:** {issue['reporter']}\n"
+                     f"**Created:** {issue['created']}\n"
+                     f"**Updated:** {issue['updated']}\n\n")
         
         if issue['description']:
-            formatted_result += f"**Description:**\n{issue['description']}\n"
+            buffer.write(f"**Description:**\n{issue['description']}\n")
         
-        return formatted_result
+        return buffer.getvalue()
         
     except Exception as e:
         logger.error(f"Error in get_jira_issue: {e}")
@@ -230,52 +747,30 @@ def get_jira_issue(issue_key: str) -> str:
 
 
 @mcp.tool()
-def list_jira_projects() -> str:
+async def list_jira_projects() -> str:
     """List accessible Jira projects (limited to OCPBUGS and CNF).
     
     Returns:
         JSON string containing list of allowed projects
     """
     try:
-        client = get_jira_client()
-        
-        # Define the allowed projects
-        allowed_projects = ["OCPBUGS", "CNF"]
-        
-        response = requests.get(
-            f"{client.base_url}/rest/api/2/project",
-            headers=client.headers,
-            timeout=30
-        )
-        response.raise_for_status()
-        
-        projects = response.json()
-        project_list = []
-        
-        # Filter to only include allowed projects
-        for project in projects:
-            project_key = project.get("key")
-            if project_key in allowed_projects:
-                project_list.append({
-                    "key": project_key,
-                    "name": project.get("name"),
-                    "id": project.get("id")
-                })
+        project_list = await get_projects()
         
         result = {
             "total_projects": len(project_list),
-            "allowed_projects": allowed_projects,
+            "allowed_projects": ALLOWED_PROJECTS,
             "projects": project_list
         }
         
         # Format the results as a readable list
-        formatted_result = f"Available Jira projects ({len(project_list)} found):\n\n"
+        buffer = io.StringIO()
+        buffer.write(f"Available Jira projects ({len(project_list)} found):\n\n")
         
         for i, project in enumerate(project_list, 1):
-            formatted_result += f"{i}. **{project['key']}** - {project['name']}\n"
-            formatted_result += f"   - ID: {project['id']}\n\n"
+            buffer.write(f"{i}. **{project['key']}** - {project['name']}\n"
+                         f"   - ID: {project['id']}\n\n")
         
-        return formatted_result
+        return buffer.getvalue()
         
     except Exception as e:
         logger.error(f"Error in list_jira_projects: {e}")
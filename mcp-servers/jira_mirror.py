@@ -0,0 +1,176 @@
+"""Local mirror of Jira issues with a full-text index."""
+
+import asyncio
+import contextlib
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+MIRROR_DB = os.environ.get(
+    "JIRA_MIRROR_DB",
+    os.path.join(os.path.expanduser("~"), ".cache", "lightspeed-agent",
+                 "jira.db"))
+# Seconds after the last sync during which the mirror answers the tools
+MIRROR_MAX_AGE = int(os.environ.get("JIRA_MIRROR_MAX_AGE", 3600))
+SYNC_PAGE_SIZE = 100
+# Bumped when the schema of the full-text index changes, it is rebuilt then
+SCHEMA_VERSION = 1
+
+FIELDS = ["key", "summary", "description", "status", "assignee", "reporter",
+          "created", "updated"]
+
+
+class JiraMirror:
+    """SQLite mirror of Jira issues indexed with FTS5.
+
+    Issues are synced incrementally per project from the last seen
+    `updated` timestamp and searched with bm25 ranking, summary matches
+    weigh more than description matches. Index rows share the rowid of
+    their issue.
+    """
+
+    def __init__(self, path: str = MIRROR_DB, max_age: int = MIRROR_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self.connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS issues (
+                key TEXT PRIMARY KEY, project TEXT, summary TEXT,
+                description TEXT, status TEXT, assignee TEXT, reporter TEXT,
+                created TEXT, updated TEXT)""")
+            if db.execute("PRAGMA user_version").fetchone()[0] \
+                    < SCHEMA_VERSION:
+                db.execute("DROP TABLE IF EXISTS issues_fts")
+            db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS issues_fts
+                USING fts5(summary, description)""")
+            if db.execute("PRAGMA user_version").fetchone()[0] \
+                    < SCHEMA_VERSION:
+                db.execute("""INSERT INTO issues_fts(rowid, summary,
+                    description) SELECT rowid, summary, description
+                    FROM issues""")
+                db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            db.execute("""CREATE TABLE IF NOT EXISTS sync_state (
+                project TEXT PRIMARY KEY, watermark TEXT, synced REAL)""")
+
+    def connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def upsert(self, db: sqlite3.Connection, project: str, issue: dict):
+        row = db.execute("SELECT rowid FROM issues WHERE key = ?",
+                         (issue["key"],)).fetchone()
+        if row:
+            db.execute("DELETE FROM issues_fts WHERE rowid = ?", (row[0],))
+        rowid = db.execute(
+            "INSERT OR REPLACE INTO issues VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (issue["key"], project, issue["summary"],
+             issue["description"] or "", issue["status"], issue["assignee"],
+             issue["reporter"], issue["created"], issue["updated"])).lastrowid
+        db.execute("INSERT INTO issues_fts(rowid, summary, description) "
+                   "VALUES (?, ?, ?)",
+                   (rowid, issue["summary"], issue["description"] or ""))
+
+    async def sync(self, client, project: str) -> int:
+        """Fetch the issues of project updated since the last sync.
+
+        The JQL watermark starts a day before the newest mirrored update,
+        JQL dates are in the Jira user's timezone and re-fetched issues are
+        simply replaced.
+        """
+        with self.connect() as db:
+            row = db.execute(
+                "SELECT watermark FROM sync_state WHERE project = ?",
+                (project,)).fetchone()
+        jql = f'project = "{project}"'
+        if row and row["watermark"]:
+            since = datetime.strptime(row["watermark"][:10], "%Y-%m-%d")
+            since -= timedelta(days=1)
+            jql += f' AND updated >= "{since:%Y-%m-%d}"'
+        jql += ' ORDER BY updated ASC'
+
+        synced = 0
+        watermark = row["watermark"] if row else ""
+        # Pages are written while the next one is fetched
+        async with contextlib.aclosing(client.search_pages(
+                jql, page_size=SYNC_PAGE_SIZE, truncated=False)) as pages:
+            async for issues in pages:
+                with self.connect() as db:
+                    for issue in issues:
+                        self.upsert(db, project, issue)
+                        watermark = max(watermark, issue["updated"] or "")
+                synced += len(issues)
+                logger.info(f"Synced {synced} {project} issues")
+
+        with self.connect() as db:
+            db.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)",
+                       (project, watermark, time.time()))
+        return synced
+
+    def age(self, project: str) -> Optional[float]:
+        """Seconds since project was last synced, None if never synced."""
+        with self.connect() as db:
+            row = db.execute(
+                "SELECT synced FROM sync_state WHERE project = ?",
+                (project,)).fetchone()
+        return time.time() - row["synced"] if row else None
+
+    def is_fresh(self, project: str) -> bool:
+        age = self.age(project)
+        return age is not None and age <= self.max_age
+
+    def search(self, project: str, search_text: str,
+               max_results: int = 10) -> List[dict]:
+        """Ranked issues of project matching all words of search_text,
+        or any of them when none matches all."""
+        words = re.findall(r"\w+", search_text)
+        if not words:
+            return []
+        terms = ['"' + word.replace('"', '""') + '"' for word in words]
+        with self.connect() as db:
+            for match in (" AND ".join(terms), " OR ".join(terms)):
+                rows = db.execute(
+                    f"""SELECT {", ".join("issues." + f for f in FIELDS)}
+                    FROM issues_fts JOIN issues
+                    ON issues.rowid = issues_fts.rowid
+                    WHERE issues_fts MATCH ? AND issues.project = ?
+                    ORDER BY bm25(issues_fts, 10.0, 1.0) LIMIT ?""",
+                    (match, project, max_results)).fetchall()
+                if rows:
+                    return [dict(row) for row in rows]
+        return []
+
+    def get(self, issue_key: str) -> Optional[dict]:
+        with self.connect() as db:
+            row = db.execute(
+                f"SELECT {', '.join(FIELDS)} FROM issues WHERE key = ?",
+                (issue_key,)).fetchone()
+        return dict(row) if row else None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "sync":
+        print("Usage help:\n\
+        python jira_mirror.py sync [project_key ...]")
+        sys.exit(1)
+
+    # The MCP server module is only needed to talk to Jira
+    from jira import ALLOWED_PROJECTS, get_jira_client, run
+
+    async def sync(mirror, projects):
+        client = get_jira_client()
+        return await asyncio.gather(*(mirror.sync(client, project)
+                                      for project in projects))
+
+    logging.basicConfig(level=logging.INFO)
+    mirror = JiraMirror()
+    projects = sys.argv[2:] or ALLOWED_PROJECTS
+    for project, synced in zip(projects, run(sync(mirror, projects))):
+        print(f"Synced {synced} {project} issues into {mirror.path}")
@@ -0,0 +1,245 @@
+import atexit
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Write the trace of the process to this file when it exits
+TRACE_FILE = os.environ.get("LIGHTSPEED_AGENT_TRACE")
+# Most recent spans kept for the trace, older ones only count in the totals
+MAX_SPANS = 100000
+PREFIX = "lightspeed_agent"
+
+
+def labels_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def label_text(labels):
+    """Prometheus label set of labels, empty when there are none"""
+    if not labels:
+        return ""
+    return "{" + ",".join(
+        f'{name}="' + value.replace("\\", "\\\\").replace('"', '\\"')
+        .replace("\n", "\\n") + '"' for name, value in labels) + "}"
+
+
+class Metrics():
+    """Spans, counters and size summaries of one process.
+
+    Spans are kept for the JSON trace, in the Chrome trace event format
+    that Perfetto and chrome://tracing load, and summed per name for the
+    Prometheus text format. Worker processes drain theirs into the results
+    they return and the parent merges them.
+    """
+    def __init__(self, max_spans=MAX_SPANS):
+        self.max_spans = max_spans
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded, with a new lock"""
+        self.lock = threading.Lock()
+        self.spans = deque(maxlen=self.max_spans)
+        self.timers = {}
+        self.counters = {}
+        self.sizes = {}
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """Time the block, attrs can be completed inside it"""
+        start = time.time()
+        started = time.perf_counter()
+        error = None
+        try:
+            yield attrs
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.record(name, start, time.perf_counter() - started, attrs,
+                        error)
+
+    def record(self, name, start, duration, attrs=None, error=None,
+               pid=None, tid=None):
+        span = {"name": name, "start": start, "duration": duration,
+                "pid": pid or os.getpid(),
+                "tid": tid or threading.get_ident(),
+                "attrs": attrs or {}, "error": error}
+        with self.lock:
+            self.spans.append(span)
+            timer = self.timers.setdefault(name, [0, 0.0, 0.0, 0])
+            timer[0] += 1
+            timer[1] += duration
+            timer[2] = max(timer[2], duration)
+            timer[3] += error is not None
+
+    def count(self, name, value=1, **labels):
+        key = (name, labels_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value):
+        """Add value, a byte size, to the summary of name"""
+        with self.lock:
+            size = self.sizes.setdefault(name, [0, 0, 0])
+            size[0] += 1
+            size[1] += value
+            size[2] = max(size[2], value)
+
+    def hit_rates(self):
+        """Hit rate of every counter labelled with result=hit or miss"""
+        totals = {}
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                result = dict(labels).get("result")
+                if result in ("hit", "miss"):
+                    total = totals.setdefault(name, [0, 0])
+                    total[result == "miss"] += value
+        return {name: hits / (hits + misses)
+                for name, (hits, misses) in totals.items() if hits + misses}
+
+    def drain(self):
+        """Remove and return everything recorded, for merge() in the parent
+        process"""
+        with self.lock:
+            drained = {"spans": list(self.spans),
+                       "counters": [[name, list(labels), value] for
+                                    (name, labels), value in
+                                    self.counters.items()],
+                       "sizes": [[name, size]
+                                 for name, size in self.sizes.items()]}
+            self.spans.clear()
+            self.timers.clear()
+            self.counters.clear()
+            self.sizes.clear()
+        return drained
+
+    def merge(self, drained):
+        if not drained:
+            return
+        for span in drained["spans"]:
+            self.record(span["name"], span["start"], span["duration"],
+                        span["attrs"], span["error"], span["pid"],
+                        span["tid"])
+        for name, labels, value in drained["counters"]:
+            self.count(name, value, **dict(labels))
+        with self.lock:
+            for name, (count, total, largest) in drained["sizes"]:
+                size = self.sizes.setdefault(name, [0, 0, 0])
+                size[0] += count
+                size[1] += total
+                size[2] = max(size[2], largest)
+
+    def summary(self):
+        hit_rates = self.hit_rates()
+        with self.lock:
+            return {
+                "spans": {name: {"count": count, "seconds": total,
+                                 "max_seconds": largest, "errors": errors}
+                          for name, (count, total, largest, errors)
+                          in self.timers.items()},
+                "counters": [{"name": name, "labels": dict(labels),
+                              "value": value}
+                             for (name, labels), value
+                             in self.counters.items()],
+                "bytes": {name: {"count": count, "bytes": total,
+                                 "max_bytes": largest}
+                          for name, (count, total, largest)
+                          in self.sizes.items()},
+                "hit_rates": hit_rates,
+            }
+
+    def trace(self):
+        with self.lock:
+            spans = list(self.spans)
+        return {
+            "traceEvents": [{
+                "name": span["name"], "ph": "X", "cat": "agent",
+                "ts": span["start"] * 1e6, "dur": span["duration"] * 1e6,
+                "pid": span["pid"], "tid": span["tid"],
+                "args": dict(span["attrs"], error=span["error"])
+                if span["error"] else span["attrs"]} for span in spans],
+            "displayTimeUnit": "ms",
+            "metrics": self.summary(),
+        }
+
+    def write_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.trace(), f, default=str)
+
+    def prometheus(self):
+        """Totals in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            timers = dict(self.timers)
+            counters = dict(self.counters)
+            sizes = dict(self.sizes)
+        if timers:
+            lines += [f"# HELP {PREFIX}_span_seconds Time spent per stage",
+                      f"# TYPE {PREFIX}_span_seconds summary"]
+            for name, (count, total, _, _) in sorted(timers.items()):
+                lines += [
+                    f'{PREFIX}_span_seconds_count{{span="{name}"}} {count}',
+                    f'{PREFIX}_span_seconds_sum{{span="{name}"}} {total}']
+            lines.append(f"# TYPE {PREFIX}_span_seconds_max gauge")
+            lines += [f'{PREFIX}_span_seconds_max{{span="{name}"}} {largest}'
+                      for name, (_, _, largest, _) in sorted(timers.items())]
+            lines.append(f"# TYPE {PREFIX}_span_errors_total counter")
+            lines += [f'{PREFIX}_span_errors_total{{span="{name}"}} {errors}'
+                      for name, (_, _, _, errors) in sorted(timers.items())]
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            lines += [f"{PREFIX}_{name}_total{label_text(labels)} {value}"
+                      for (counter, labels), value in sorted(counters.items())
+                      if counter == name]
+        for name, (count, total, _) in sorted(sizes.items()):
+            lines += [f"# TYPE {PREFIX}_{name} summary",
+                      f"{PREFIX}_{name}_count {count}",
+                      f"{PREFIX}_{name}_sum {total}"]
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+span = METRICS.span
+count = METRICS.count
+observe = METRICS.observe
+# A forked worker starts with a copy of what the parent recorded, which it
+# would hand back to be merged twice, and of its lock, possibly held by a
+# thread the fork did not copy
+os.register_at_fork(after_in_child=METRICS.reset)
+
+
+def in_worker():
+    """Whether this is a worker process of a process pool"""
+    # Workers always import multiprocessing, other processes need not
+    multiprocessing = sys.modules.get("multiprocessing")
+    return multiprocessing is not None and \
+        multiprocessing.parent_process() is not None
+
+
+def trace_to(path):
+    """Write the trace of this process to path when it exits"""
+    atexit.register(METRICS.write_trace, path)
+
+
+def profile_to(path):
+    """cProfile this process until it exits and dump the stats to path, for
+    pstats or snakeviz. Process pool workers are not profiled."""
+    import cProfile
+
+    profiler = cProfile.Profile()
+
+    def dump():
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Profile written to {path}")
+
+    atexit.register(dump)
+    profiler.enable()
+
+
+if TRACE_FILE and not in_worker():
+    trace_to(TRACE_FILE)
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+
+ANALYSIS_DB = os.environ.get(
+    "ANALYSIS_DB",
+    os.path.join(os.path.expanduser("~"), ".cache", "lightspeed-agent",
+                 "analyses.db"))
+
+JIRA_KEY = re.compile(r"\b[A-Z][A-Z0-9]+-\d+\b")
+COLUMNS = ["id", "created", "mode", "logfile", "log_hash", "logtype",
+           "baselines", "diff_key", "prompt_hash", "prompt", "model",
+           "provider", "response", "tool_results", "jira_keys",
+           "diff_seconds", "query_seconds"]
+
+
+def digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def diff_key(juicer, max_bytes):
+    """Key of everything a diff depends on: the log, its baselines, the
+    logjuicer config and the options shaping the diff"""
+    from logjuicer import file_digest, log_digest
+
+    return digest(":".join(
+        [log_digest(juicer.logfile), file_digest(juicer.config)]
+        + [log_digest(baseline) for baseline in juicer.baselines]
+        + [f"prefilter={juicer.prefilter}", f"max_bytes={max_bytes}"]))
+
+
+def jira_keys(response):
+    """Jira issue keys mentioned in a response or its tool results"""
+    texts = [response.get("response", "")] + [
+        str(tool_result.get("content", ""))
+        for tool_result in response.get("tool_results", [])]
+    return sorted({key for text in texts for key in JIRA_KEY.findall(text)})
+
+
+class AnalysisStore:
+    """SQLite history of every analysis.
+
+    Each row keeps the log and diff keys, the prompt, the response with
+    its tool results, the Jira keys it mentions and how long the diff and
+    the query took. Diffs are stored once per diff key, so an unchanged
+    log only needs its query re-run when the prompt changes.
+    """
+
+    def __init__(self, path=ANALYSIS_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self.connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS diffs (
+                key TEXT PRIMARY KEY, diff TEXT, created REAL)""")
+            db.execute("""CREATE TABLE IF NOT EXISTS analyses (
+                id INTEGER PRIMARY KEY, created REAL, mode TEXT,
+                logfile TEXT, log_hash TEXT, logtype TEXT, baselines TEXT,
+                diff_key TEXT, prompt_hash TEXT, prompt TEXT, model TEXT,
+                provider TEXT, response TEXT, tool_results TEXT,
+                jira_keys TEXT, diff_seconds REAL, query_seconds REAL)""")
+            for column in ("logfile", "log_hash", "logtype", "created"):
+                db.execute(f"""CREATE INDEX IF NOT EXISTS analyses_{column}
+                    ON analyses ({column})""")
+            db.execute("""CREATE INDEX IF NOT EXISTS analyses_lookup
+                ON analyses (diff_key, prompt_hash, model, provider)""")
+
+    def connect(self):
+        # One connection per operation, analyses finish in several threads
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def diff(self, key):
+        with self.connect() as db:
+            row = db.execute("SELECT diff FROM diffs WHERE key = ?",
+                             (key,)).fetchone()
+        return row["diff"] if row else None
+
+    def analysis(self, key, prompt, model, provider):
+        """Latest response for the same diff, prompt and model"""
+        with self.connect() as db:
+            row = db.execute(
+                "SELECT response, tool_results FROM analyses WHERE "
+                "diff_key = ? AND prompt_hash = ? AND model = ? AND "
+                "provider = ? ORDER BY created DESC LIMIT 1",
+                (key, digest(prompt), model, provider)).fetchone()
+        if row is None:
+            return None
+        return {"response": row["response"],
+                "tool_results": json.loads(row["tool_results"])}
+
+    def record(self, analysis, prompt, model, provider, response,
+               query_seconds, mode="analyze"):
+        """Store analysis, the diff record made by juice_log, with the
+        response to prompt"""
+        now = time.time()
+        with self.connect() as db:
+            if analysis.get("diff_key"):
+                db.execute("INSERT OR IGNORE INTO diffs VALUES (?, ?, ?)",
+                           (analysis["diff_key"], analysis["diff"], now))
+            db.execute(
+                f"INSERT INTO analyses ({', '.join(COLUMNS[1:])}) "
+                f"VALUES ({', '.join('?' * (len(COLUMNS) - 1))})",
+                (now, mode, analysis["logfile"], analysis.get("log_hash"),
+                 analysis.get("logtype"),
+                 json.dumps(analysis.get("baselines", [])),
+                 analysis.get("diff_key"), digest(prompt), prompt, model,
+                 provider, response.get("response", ""),
+                 json.dumps(response.get("tool_results", [])),
+                 json.dumps(jira_keys(response)),
+                 analysis.get("diff_seconds"), query_seconds))
+
+    def history(self, target=None, since=None, limit=20):
+        """Latest analyses, of a logfile or logtype when target is set"""
+        query = "SELECT * FROM analyses WHERE created > ?"
+        params = [time.time() - since if since else 0]
+        if target:
+            query += " AND (logfile = ? OR logtype = ?)"
+            params += [target, target]
+        query += " ORDER BY created DESC LIMIT ?"
+        with self.connect() as db:
+            return [dict(row) for row in
+                    db.execute(query, params + [limit]).fetchall()]
+
+    def get(self, analysis_id):
+        with self.connect() as db:
+            row = db.execute("SELECT * FROM analyses WHERE id = ?",
+                             (analysis_id,)).fetchone()
+            if row is None:
+                return None
+            analysis = dict(row)
+            analysis["diff"] = self.diff(row["diff_key"]) \
+                if row["diff_key"] else None
+        return analysis
+
+    def trend(self, since=None):
+        """Analyses and distinct logs per day and logtype, with the Jira
+        keys mentioned most"""
+        with self.connect() as db:
+            rows = db.execute(
+                "SELECT date(created, 'unixepoch') AS day, logtype, "
+                "COUNT(*) AS analyses, COUNT(DISTINCT log_hash) AS logs, "
+                "group_concat(jira_keys, '') AS jira_keys FROM analyses "
+                "WHERE created > ? GROUP BY day, logtype "
+                "ORDER BY day DESC, analyses DESC",
+                (time.time() - since if since else 0,)).fetchall()
+        trend = []
+        for row in rows:
+            counts = {}
+            for key in JIRA_KEY.findall(row["jira_keys"] or ""):
+                counts[key] = counts.get(key, 0) + 1
+            trend.append({
+                "day": row["day"], "logtype": row["logtype"],
+                "analyses": row["analyses"], "logs": row["logs"],
+                "jira_keys": sorted(counts, key=counts.get,
+                                    reverse=True)[:5]})
+        return trend
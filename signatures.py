@@ -0,0 +1,163 @@
+import importlib
+import os
+import re
+import sys
+from collections import Counter
+
+from metrics import span
+
+MCP_SERVERS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'mcp-servers')
+# Concurrent Jira searches per analysis
+SEARCH_WORKERS = 4
+MAX_TERMS = 6
+
+# Components of the latency and networking stack worth searching Jira for
+COMPONENTS = [
+    "performance profile", "performance-addon-operator", "node tuning",
+    "tuned", "kubelet", "cri-o", "crio", "cpu manager", "topology manager",
+    "irqbalance", "rt kernel", "kernel-rt", "numa", "hugepages", "sriov",
+    "ptp", "linuxptp", "phc2sys", "ts2phc", "ovn", "ovs", "multus", "dpdk",
+    "machine-config", "etcd", "kube-apiserver", "smt", "c-states",
+]
+
+TESTS = [
+    "oslat", "cyclictest", "hwlatdetect", "stress-ng", "cnf-tests",
+    "ptp-tests", "sriov-tests", "latency-tests", "iperf", "testpmd",
+]
+
+ERROR = re.compile(
+    r"\b(error|failed|failure|fail|fatal|panic|timed out|timeout|exceeded|"
+    r"unable to|cannot|refused|oom)\b[:\s]*(.*)", re.IGNORECASE)
+TEST_NAME = re.compile(
+    r"(?:--- FAIL:\s*(\S+)|\[(?:It|Fail)\]\s*([^\[\]\n]+)|"
+    r"test[_ ]?name[=:]\s*(\S+))", re.IGNORECASE)
+THRESHOLD = re.compile(
+    r"((?:max(?:imum)?\s+)?latency|threshold|jitter|offset)\D{0,30}?"
+    r"(\d+(?:\.\d+)?)\s*(ns|us|µs|usec|ms|msec)\b", re.IGNORECASE)
+NOISE = re.compile(
+    r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}\S*|0x[0-9a-f]+|"
+    r"\b[0-9a-f]{8,}\b|\d+(?:\.\d+)?", re.IGNORECASE)
+
+
+def clean(text, max_words=8):
+    """Drop timestamps, ids and numbers, keep the first max_words words"""
+    words = re.findall(r"[\w\-./]+", NOISE.sub(" ", text))
+    return " ".join(words[:max_words])
+
+
+def extract_signatures(diff):
+    """Extract failure signatures from a logjuicer diff.
+
+    Returns the error messages, test names, latency thresholds and
+    components found in the diff, most frequent first.
+    """
+    errors = Counter()
+    tests = Counter()
+    thresholds = Counter()
+    components = Counter()
+    for line in diff.splitlines():
+        lower = line.lower()
+        match = ERROR.search(line)
+        if match:
+            message = clean(match.group(1) + " " + match.group(2))
+            if len(message.split()) > 1:
+                errors[message] += 1
+        for match in TEST_NAME.finditer(line):
+            tests[clean(next(group for group in match.groups()
+                             if group))] += 1
+        for test in TESTS:
+            if test in lower:
+                tests[test] += 1
+        for match in THRESHOLD.finditer(line):
+            thresholds[" ".join(match.groups())] += 1
+        for component in COMPONENTS:
+            if re.search(r"\b" + re.escape(component) + r"\b", lower):
+                components[component] += 1
+    return {
+        "errors": [error for error, _ in errors.most_common()],
+        "tests": [test for test, _ in tests.most_common()],
+        "thresholds": [threshold for threshold, _ in
+                       thresholds.most_common()],
+        "components": [component for component, _ in
+                       components.most_common()],
+    }
+
+
+def search_terms(signatures, max_terms=MAX_TERMS):
+    """Jira search texts for the signatures, most specific first"""
+    terms = []
+    test = signatures["tests"][0] if signatures["tests"] else None
+    for component in signatures["components"][:2]:
+        terms.append(f"{test} {component}" if test else component)
+    if signatures["thresholds"]:
+        # What was measured, the values themselves are not searchable
+        metric = signatures["thresholds"][0].rsplit(" ", 2)[0].lower()
+        terms.append(f"{test} {metric}" if test else metric)
+    terms += signatures["errors"][:3]
+    if test:
+        terms.append(test)
+    # Jira text search treats quotes and backslashes specially
+    terms = [re.sub(r'["\\]', " ", term).strip() for term in terms]
+    return list(dict.fromkeys(term for term in terms if term))[:max_terms]
+
+
+def load_jira():
+    """Import the Jira MCP server module for its client and mirror,
+    raising RuntimeError when Jira can not be searched from here"""
+    missing = [name for name in ("JIRA_BASE_URL", "JIRA_TOKEN")
+               if not os.environ.get(name)]
+    if missing:
+        raise RuntimeError(f"set {' and '.join(missing)} to search Jira")
+    if MCP_SERVERS not in sys.path:
+        sys.path.insert(0, MCP_SERVERS)
+    try:
+        return importlib.import_module("jira")
+    except ImportError as e:
+        raise RuntimeError(f"the Jira MCP server needs {e.name}, "
+                           "pip install httpx mcp") from e
+
+
+def correlate(diff, project_keys, max_results=5):
+    """Search Jira for the failure signatures of diff concurrently.
+
+    Returns the found issues ranked by how many search terms matched
+    them, each with the list of terms that matched. Failed searches are
+    skipped unless they all fail.
+    """
+    terms = search_terms(extract_signatures(diff))
+    if not terms:
+        return []
+    jira = load_jira()
+    searches = [(project_key, term) for project_key in project_keys
+                for term in terms]
+    with span("jira_correlate", searches=len(searches)):
+        results = jira.run(jira.search_many(searches, max_results,
+                                            SEARCH_WORKERS,
+                                            return_exceptions=True))
+    failed = [found for found in results if isinstance(found, Exception)]
+    if failed and len(failed) == len(searches):
+        raise failed[0]
+    if failed:
+        print(f"{len(failed)} of {len(searches)} Jira searches failed: "
+              f"{failed[0]}")
+
+    issues = {}
+    for (_, term), found in zip(searches, results):
+        if isinstance(found, Exception):
+            continue
+        for issue in found:
+            issue = issues.setdefault(issue["key"], dict(issue, matched=[]))
+            issue["matched"].append(term)
+    return sorted(issues.values(),
+                  key=lambda issue: (len(issue["matched"]), issue["updated"]),
+                  reverse=True)
+
+
+def format_candidates(issues, limit=10):
+    lines = []
+    for issue in issues[:limit]:
+        lines.append(f"- {issue['key']} [{issue['status']}] "
+                     f"{issue['summary']} (matched: "
+                     f"{', '.join(issue['matched'])})")
+    return "\n".join(lines)